@@ -0,0 +1,2 @@
+""" Offline benchmarks, run them with python -m <package>.benchmarks.<name>
+    from the directory holding the package. """
@@ -1,3 +1,7 @@
+# Unmodified copy of the decorator.py (3.4.0) the package vendored before
+# util.logged_in became a plain wrapper, so benchmarks/logged_in.py keeps
+# measuring the old decorator.
+
 ##########################     LICENCE     ###############################
 
 # Copyright (c) 2005-2012, Michele Simionato
@@ -0,0 +1,174 @@
+""" Load generator: N concurrent iRWebStats clients logged in to the mock
+    server (mock_server.py) running a mix of operations for a while, then
+    a report of p50/p95/p99 latency per operation, operations and requests
+    per second, and the server statuses. Example:
+
+        python -m <package>.benchmarks.load --callers 20 --duration 10 \\
+            --latency 0.02,0.08 --session-ttl 5 --mix profile=6,laps=2
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import random
+import time
+
+from ..client import iRWebStats
+from ..ratelimit import RateLimiter
+from ..session_store import MemorySessionStore
+from ..transport import HTTPTransport
+from .mock_server import MockIRacingServer
+
+MIX = {'profile': 6, 'standings': 2, 'laps': 2}
+
+
+# Operations: one "user action" each, made of one or more requests
+
+async def profile(client, rnd):
+    """ A driver profile page: stats, last races and iRating chart. """
+    custid = rnd.randrange(1, 500000)
+    await asyncio.gather(client.career_stats(custid),
+                         client.yearly_stats(custid),
+                         client.lastrace_stats(custid),
+                         client.iratingchart(custid))
+
+
+async def standings(client, rnd):
+    """ A full standings sweep of a season (every page). """
+    async for _ in client.iter_season_standings(rnd.randrange(1000, 2000),
+                                                rnd.randrange(1, 100)):
+        pass
+
+
+async def laps(client, rnd):
+    """ An event's results and lap chart. """
+    subsession = rnd.randrange(10 ** 7, 2 * 10 ** 7)
+    await asyncio.gather(client.event_results(subsession),
+                         client.event_laps_all(subsession))
+
+
+OPERATIONS = {'profile': profile, 'standings': standings, 'laps': laps}
+
+
+def percentile(values, p):
+    """ Nearest rank percentile of sorted values. """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(
+        p / 100 * len(values) + 0.5)) - 1))]
+
+
+async def caller(n, server, mix, duration, client_rate, latencies, errors):
+    rnd = random.Random(n)
+    transport = HTTPTransport(host_map=server.host_map)
+    client = iRWebStats('user%d' % n, 'password', logging.getLogger('load'),
+                        transport=transport,
+                        rate_limiter=RateLimiter(rate=client_rate),
+                        session_store=MemorySessionStore())
+    names, weights = list(mix), list(mix.values())
+    async with transport, client:
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            # A re-login that failed (429, 500) leaves the client logged out
+            if not client.logged and not await client.login():
+                errors['login'] += 1
+                continue
+            name = rnd.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                await OPERATIONS[name](client, rnd)
+            except Exception:
+                errors[name] += 1
+                continue
+            if not client.logged:  # Calls were skipped
+                errors[name] += 1
+                continue
+            latencies[name].append(time.perf_counter() - start)
+
+
+async def run(callers=10, duration=10, mix=None, client_rate=50,
+              **server_options):
+    """ Runs the load and returns the report. server_options are the
+        MockIRacingServer arguments (latency, error_rate, ...). """
+    mix = mix or MIX
+    logging.getLogger('load').setLevel(logging.ERROR)
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    async with MockIRacingServer(**server_options) as server:
+        start = time.monotonic()
+        await asyncio.gather(*[
+            caller(n, server, mix, duration, client_rate, latencies, errors)
+            for n in range(callers)])
+        elapsed = time.monotonic() - start
+        server_stats = server.stats()
+
+    operations = {}
+    for name in mix:
+        values = sorted(latencies[name])
+        operations[name] = {
+            'count': len(values), 'errors': errors[name],
+            'per_sec': len(values) / elapsed,
+            'p50': percentile(values, 50), 'p95': percentile(values, 95),
+            'p99': percentile(values, 99)}
+    return {'callers': callers, 'elapsed': elapsed,
+            'login_errors': errors['login'],
+            'operations_per_sec': sum(len(v) for v in latencies.values()) /
+            elapsed,
+            'requests_per_sec': server_stats['requests'] / elapsed,
+            'operations': operations, 'server': server_stats}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--callers', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds each caller runs operations')
+    parser.add_argument('--mix', default=','.join(
+        '%s=%s' % item for item in MIX.items()),
+        help='operation=weight list, from %s' % ', '.join(OPERATIONS))
+    parser.add_argument('--client-rate', type=float, default=50,
+                        help='requests/sec allowed by each client limiter')
+    parser.add_argument('--latency', default='0',
+                        help='server latency in seconds, or min,max')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--session-ttl', type=float, default=None)
+    parser.add_argument('--server-rate', type=float, default=None,
+                        help='requests/sec accepted by the server')
+    parser.add_argument('--json', action='store_true',
+                        help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    mix = {}
+    for item in args.mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            parser.error('unknown operation %r' % name)
+        mix[name] = float(weight or 1)
+    latency = tuple(float(v) for v in args.latency.split(','))
+    report = asyncio.run(run(
+        args.callers, args.duration, mix, args.client_rate,
+        latency=latency if len(latency) > 1 else latency[0],
+        error_rate=args.error_rate, session_ttl=args.session_ttl,
+        rate=args.server_rate))
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+        return
+    print('%d callers, %.1fs: %.1f operations/s, %.1f requests/s, '
+          '%d logins (%d failed), statuses %s' % (
+              report['callers'], report['elapsed'],
+              report['operations_per_sec'], report['requests_per_sec'],
+              report['server']['logins'], report['login_errors'],
+              report['server']['statuses']))
+    print('%-10s %7s %7s %9s %9s %9s' % ('operation', 'count', 'errors',
+                                         'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, op in report['operations'].items():
+        ms = lambda v: '-' if v is None else '%.1f' % (v * 1000)
+        print('%-10s %7d %7d %9s %9s %9s' % (
+            name, op['count'], op['errors'], ms(op['p50']), ms(op['p95']),
+            ms(op['p99'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+""" Per call overhead of the logged_in decorator on an async method, and
+    the cost of decorating, for the current one and the old one (the
+    vendored decorator.py 3.4.0 FunctionMaker plus getfullargspec on every
+    call, kept in decorator_3_4_0.py). """
+import asyncio
+import inspect
+import logging
+import time
+
+from ..util import logged_in
+from .decorator_3_4_0 import decorator
+
+CALLS = 200000
+DECORATIONS = 2000
+
+
+class Client:
+    logged = True
+    custid = 1
+    log = logging.getLogger(__name__)
+
+    async def method(self, custid=None, category=1):
+        return custid
+
+
+def old_logged_in():
+    """ The logged_in of before. """
+
+    def __logged_in(func, *args, **kw):
+        args2 = list(args)
+        irweb = args2[0]
+        if not irweb.logged:
+            return None
+        if 'custid' in inspect.getfullargspec(func).args:
+            args2[1] = args2[1] if args2[1] is not None else irweb.custid
+        return func(*args2, **kw)
+
+    return lambda func: decorator(__logged_in, func)
+
+
+async def per_call(method, client, calls=CALLS):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await method(client, None)
+    return (time.perf_counter() - start) / calls
+
+
+def decoration_time(wrap, count=DECORATIONS):
+    start = time.perf_counter()
+    for _ in range(count):
+        wrap(Client.method)
+    return (time.perf_counter() - start) / count
+
+
+def run():
+    """ Returns {name: seconds} of every measure. """
+    client = Client()
+    wrappers = {'new': logged_in, 'old': old_logged_in()}
+    results = {'call_undecorated': asyncio.run(
+        per_call(Client.method, client))}
+    for name, wrap in wrappers.items():
+        results['call_' + name] = asyncio.run(per_call(wrap(Client.method),
+                                                       client))
+        results['overhead_' + name] = results['call_' + name] - \
+            results['call_undecorated']
+        results['decorate_' + name] = decoration_time(wrap)
+    return results
+
+
+if __name__ == '__main__':
+    for name, seconds in run().items():
+        print('%-20s %8.3f us' % (name, seconds * 1e6))
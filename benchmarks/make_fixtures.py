@@ -0,0 +1,440 @@
+""" Writes the response fixtures used by the benchmarks (fixtures/). They
+    follow the layout of the iRacing responses at realistic sizes, with
+    made up names and numbers (seeded, so the files are reproducible). Run
+    it again after changing it: python -m <package>.benchmarks.make_fixtures
+"""
+import json
+import os
+import random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+SEED = 2016
+DRIVERS = 60  # Field size of the event fixtures
+LAPS = 45
+
+
+def listing(items):
+    """ A home page listing as the site embeds it (spaces as '+'). """
+    return json.dumps(items, separators=(',', ':')).replace(' ', '+')
+
+
+def home_page(rnd):
+    tracks = [{'id': i, 'name': 'Track %03d' % i,
+               'config': rnd.choice(['Full Course', 'Oval', 'Short', '']),
+               'pkgid': 100 + i, 'catid': rnd.choice([1, 2]),
+               'priority': rnd.randint(0, 9), 'lowerNameAndConfig':
+                   'track %03d' % i} for i in range(1, 301)]
+    cars = [{'id': i, 'name': 'Car %03d' % i, 'abbrev': 'C%03d' % i,
+             'pkgid': 500 + i, 'catid': rnd.choice([1, 2]),
+             'skuname': 'Car %03d' % i} for i in range(1, 151)]
+    classes = [{'id': i, 'name': 'Class %03d' % i, 'shortname': 'CL%d' % i,
+                'carsinclass': [{'id': rnd.randint(1, 150)}
+                                for _ in range(rnd.randint(1, 4))]}
+               for i in range(1, 121)]
+    clubs = [{'id': i, 'name': 'Club %02d' % i, 'region': 'Region %d' % (
+        i % 6)} for i in range(1, 41)]
+    seasons = [{'seriesid': 200 + i, 'seasonid': 2000 + i,
+                'seriesname': 'Series %03d' % i, 'catid': rnd.choice([1, 2]),
+                'year': 2016, 'quarter': 3,
+                'cars': [{'name': 'Car %03d' % c, 'id': c} for c in
+                         rnd.sample(range(1, 151), rnd.randint(1, 6))]}
+               for i in range(1, 201)]
+    divisions = [{'id': i, 'name': 'Division %d' % (i + 1)}
+                 for i in range(-1, 11)]
+    quarters = [{'year': y, 'quarters': [1, 2, 3, 4]}
+                for y in range(2008, 2017)]
+
+    variables = [('TrackListing', tracks), ('CarListing', cars),
+                 ('CarClassListing', classes), ('ClubListing', clubs),
+                 ('SeasonListing', seasons), ('DivisionListing', divisions),
+                 ('YearAndQuarterListing', quarters)]
+    lines = ['<!DOCTYPE html>', '<html><head><title>iRacing.com '
+             'Membersite</title>']
+    for i in range(400):  # Page markup around the listings
+        lines.append('<link rel="stylesheet" href="/css/style%d.css">' % i)
+    lines.append('<script type="text/javascript">')
+    for name, items in variables:
+        lines.append("var %s = extractJSON('%s');" % (name, listing(items)))
+        lines.append('var %sLoaded = true;' % name)
+    lines.append('</script></head><body>')
+    for i in range(1500):
+        lines.append('<div class="row" id="r%d"><span>Item %d</span></div>'
+                     % (i, i))
+    lines.append('</body></html>')
+    return '\n'.join(lines)
+
+
+def career_stats(rnd):
+    return [{'wins': rnd.randint(0, 50), 'winPerc': rnd.random() * 30,
+             'poles': rnd.randint(0, 40),
+             'totalclubpoints': rnd.randint(0, 5000),
+             'avgStart': rnd.random() * 20, 'avgFinish': rnd.random() * 20,
+             'top5Perc': rnd.random() * 60,
+             'totalLaps': rnd.randint(100, 20000),
+             'avgIncPerRace': rnd.random() * 8,
+             'avgPtsPerRace': rnd.random() * 80,
+             'lapsLed': rnd.randint(0, 2000), 'top5': rnd.randint(0, 200),
+             'lapsLedPerc': rnd.random() * 10, 'category': category,
+             'starts': rnd.randint(0, 800)}
+            for category in ('Oval', 'Road', 'Dirt+Oval', 'Dirt+Road')]
+
+
+def yearly_stats(rnd):
+    stats = []
+    for year in range(2008, 2017):
+        for row in career_stats(rnd):
+            row['year'] = str(year)
+            row['clubpoints'] = row.pop('totalclubpoints')
+            stats.append(row)
+    return stats
+
+
+def lastrace_stats(rnd):
+    return [{'startPos': rnd.randint(1, 20), 'lapsLed': rnd.randint(0, 10),
+             'finishPos': rnd.randint(1, 20),
+             'incidents': rnd.randint(0, 12),
+             'trackName': 'Track+%03d+%%5BFull%%5D' % rnd.randint(1, 300),
+             'sof': rnd.randint(900, 4000), 'date': '2016-09-%02d' % (i + 1),
+             'seriesID': rnd.randint(200, 400), 'time': 1472688000000 + i,
+             'winnerName': 'Driver+%05d' % rnd.randint(1, 99999),
+             'winnerID': rnd.randint(1, 99999),
+             'clubPoints': rnd.randint(0, 20),
+             'champPoints': rnd.randint(0, 120),
+             'subsessionID': 15000000 + i, 'seasonID': 1600 + i % 4,
+             'winnerLL': rnd.randint(0, 30)} for i in range(10)]
+
+
+def irating_chart(rnd):
+    t, value, chart = 1230768000000, 1350, []
+    for _ in range(3000):
+        t += rnd.randint(3600, 5 * 86400) * 1000
+        value = max(300, value + rnd.randint(-90, 90))
+        chart.append([t, value])
+    return chart
+
+
+def table(columns, rows):
+    """ A {"m": header, "d": {"1": rowcount, "r": rows}} search response,
+        the rows keyed by the short column keys. """
+    header = {'1': 'rowcount'}
+    header.update({str(i + 2): name for i, name in enumerate(columns)})
+    keys = {name: key for key, name in header.items()}
+    return {'m': header, 'd': {'1': rows[1], 'r': [
+        {keys[name]: value for name, value in row.items()}
+        for row in rows[0]]}}
+
+
+def driver_search(rnd):
+    rows = [{'rn': i + 1, 'custid': 100000 + rnd.randint(0, 400000),
+             'displayname': 'Driver+%05d' % i, 'irating': rnd.randint(
+                 800, 9000), 'ttrating': rnd.randint(1000, 2000),
+             'licenselevel': rnd.randint(1, 20),
+             'licensegroup': rnd.randint(1, 5), 'srprime': rnd.randint(1, 4),
+             'srsub': rnd.randint(0, 99), 'clubid': rnd.randint(1, 40),
+             'clubname': 'Club+%02d' % rnd.randint(1, 40),
+             'countrycode': 'US', 'starts': rnd.randint(0, 900),
+             'wins': rnd.randint(0, 80), 'top25pcnt': rnd.randint(0, 100),
+             'avgstart': rnd.randint(1, 20), 'avgfinish': rnd.randint(1, 20),
+             'avgpoints': rnd.randint(0, 100),
+             'avgincidents': rnd.random() * 8,
+             'helmpattern': rnd.randint(1, 60),
+             'helmcolor1': '%06x' % rnd.randint(0, 0xffffff),
+             'helmcolor2': '%06x' % rnd.randint(0, 0xffffff),
+             'helmcolor3': '%06x' % rnd.randint(0, 0xffffff)}
+            for i in range(25)]
+    return table(list(rows[0]), (rows, 48211))
+
+
+def results_archive(rnd):
+    rows = [{'subsessionid': 15000000 + i, 'start_time':
+             '2016-07-%02d+%02d:00:00' % (1 + i % 28, i % 24),
+             'seriesid': rnd.randint(200, 400), 'carid': rnd.randint(1, 150),
+             'trackid': rnd.randint(1, 300), 'evttypeid': 5,
+             'officialsession': 1, 'licensegroup': rnd.randint(1, 5),
+             'race_week_num': i % 12, 'finishing_position': rnd.randint(
+                 0, 19), 'starting_position': rnd.randint(0, 19),
+             'incidents': rnd.randint(0, 12), 'champpoints': rnd.randint(
+                 0, 120), 'clubpoints': rnd.randint(0, 20),
+             'strengthoffield': rnd.randint(900, 4000),
+             'winnerdisplayname': 'Driver+%05d' % rnd.randint(0, 99999),
+             'winnersgroupid': rnd.randint(1, 99999),
+             'bestlaptime': rnd.randint(800000, 1200000),
+             'laps_complete': rnd.randint(10, 40),
+             'laps_led': rnd.randint(0, 10)} for i in range(25)]
+    return table(list(rows[0]), (rows, 614))
+
+
+def lap_time(rnd):
+    ms = rnd.randint(85000, 99000)
+    return '%d:%06.3f' % (ms // 60000, ms % 60000 / 1000)
+
+
+def event_csv(rnd):
+    info = ['Start Time', 'Track', 'Series', 'Hosted Session Name',
+            'Session Name', 'Subsession ID', 'Points Type', 'Event Type']
+    values = ['2016-09-01 20:00:00 GMT', 'Track 012 - Full Course',
+              'Series 042', '', '', '15012345', 'Race', 'Race']
+    columns = ['Fin Pos', 'Car ID', 'Car', 'Car Class ID', 'Car Class',
+               'Team ID', 'Cust ID', 'Name', 'Start Pos', 'Car #', 'Out ID',
+               'Out', 'Interval', 'Laps Led', 'Qualify Time',
+               'Average Lap Time', 'Fastest Lap Time', 'Fast Lap#',
+               'Laps Comp', 'Inc', 'Pts', 'Club Pts', 'Div', 'Club ID',
+               'Club', 'Old iRating', 'New iRating', 'Old License Level',
+               'Old License Sub-Level', 'New License Level',
+               'New License Sub-Level', 'Series Name', 'Max Fuel Fill%',
+               'Weight Penalty (KG)', 'Agg Pts']
+    quote = lambda row: ','.join('"%s"' % v for v in row)
+    lines = [quote(info), quote(values), '', quote(columns)]
+    for pos in range(DRIVERS):
+        custid = 100000 + pos * 37
+        old = rnd.randint(800, 5000)
+        lines.append(quote([
+            pos, 33, 'Car 033', 74, 'Class 074', -custid, custid,
+            'Driver %05d' % pos, rnd.randint(0, DRIVERS - 1), pos + 1, 0,
+            'Running', '-%d.%03d' % (pos, rnd.randint(0, 999)) if pos
+            else '', rnd.randint(0, 5), lap_time(rnd), lap_time(rnd),
+            lap_time(rnd), rnd.randint(1, LAPS), LAPS, rnd.randint(0, 12),
+            rnd.randint(0, 120), rnd.randint(0, 20), rnd.randint(1, 10),
+            rnd.randint(1, 40), 'Club %02d' % rnd.randint(1, 40), old,
+            old + rnd.randint(-80, 80), rnd.randint(1, 20), rnd.randint(
+                100, 499), rnd.randint(1, 20), rnd.randint(100, 499),
+            'Series 042', 100, 0, rnd.randint(0, 120)]))
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def lap_chart(rnd):
+    laps = []
+    for driver in range(DRIVERS):
+        custid = 100000 + driver * 37
+        t = rnd.randint(0, 50000)
+        for lap in range(LAPS + 1):
+            flags = 0
+            if lap and rnd.random() < 0.08:
+                flags = rnd.choice([2, 4, 32, 64, 4 | 128])
+            laps.append({'custid': custid, 'lap': lap, 'flags': flags,
+                         'ses_time': t, 'carnum': str(driver + 1)})
+            t += rnd.randint(850000, 990000)
+    return {'lapdata': laps, 'startgrid': [100000 + i * 37 for i in
+                                           range(DRIVERS)]}
+
+
+def event_results2(rnd):
+    obj = ('custid:100037, isOfficial:1, carID:33, avglaptime:"1:24.512", '
+           'fastestlaptime:"1:23.901", fastestlaptimems:839010, '
+           'fastestlapnum:12, bestnlapstime:"1:24.100", bestnlapsnum:5, '
+           'lapscomplete:30, incidents:2, newttRating:1650, '
+           'oldttRating:1600, sr_new:parseFloat("3.45"), '
+           'sr_old:parseFloat("3.40"), reasonOutName:"Running", ')
+    lines = ['<!DOCTYPE html>', '<html><head><title>Event Result</title>']
+    for i in range(300):
+        lines.append('\t\t<link rel="stylesheet" href="/css/result%d.css">'
+                     % i)
+    lines.append('<script type="text/javascript">')
+    lines.append('\tvar resultOBJ = {\r\r\n\t\t' + obj + '\r\r\n\t};')
+    for i in range(DRIVERS):
+        lines.append('\tvar resultOBJ%d = {custid:%d, carID:33};'
+                     % (i, 100000 + i * 37))
+    lines.append('</script></head><body>')
+    for i in range(1000):
+        lines.append('\t<tr class="row%d"><td>%d</td></tr>' % (i % 2, i))
+    lines.append('</body></html>')
+    return '\n'.join(lines)
+
+
+def series_page(rnd):
+    lines = ['<!DOCTYPE html>', '<html><head><title>Series</title>',
+             '<script type="text/javascript">']
+    for i in range(200):
+        lines.append(
+            'var seriesobj={seasonID:%d,seriesID:%d,seriesName:"Series %03d",'
+            'col_color_img:"https://members.iracing.com/members/'
+            'member_images/series/seriesid_%d/title_list.jpg",'
+            'catID:%d,isOfficial:true};' % (2000 + i, 200 + i, i, 200 + i,
+                                           rnd.choice([1, 2])))
+        lines.append('series.push(seriesobj);')
+    lines.append('</script></head><body></body></html>')
+    return '\n'.join(lines)
+
+
+def season_standings(rnd):
+    rows = [{'pos': i + 1, 'custid': 100000 + rnd.randint(0, 400000),
+             'displayname': 'Driver+%05d' % i,
+             'points': 4000 - i * rnd.randint(5, 20),
+             'dropped': rnd.randint(0, 1), 'clubid': rnd.randint(1, 40),
+             'clubname': 'Club+%02d' % rnd.randint(1, 40),
+             'countrycode': 'US', 'licenselevel': rnd.randint(1, 20),
+             'irating': rnd.randint(800, 9000),
+             'division': rnd.randint(0, 10), 'week': rnd.randint(1, 12),
+             'starts': rnd.randint(1, 80), 'wins': rnd.randint(0, 20),
+             'top5': rnd.randint(0, 40), 'poles': rnd.randint(0, 20),
+             'lapslead': rnd.randint(0, 300),
+             'avgstart': rnd.randint(1, 20), 'avgfinish': rnd.randint(1, 20),
+             'incidents': rnd.randint(0, 120),
+             'helmpattern': rnd.randint(1, 60),
+             'helmcolor1': '%06x' % rnd.randint(0, 0xffffff),
+             'helmcolor2': '%06x' % rnd.randint(0, 0xffffff),
+             'helmcolor3': '%06x' % rnd.randint(0, 0xffffff)}
+            for i in range(25)]
+    return table(list(rows[0]), (rows, 7312))
+
+
+def personal_best(rnd):
+    return [{'trackid': rnd.randint(1, 300),
+             'trackname': 'Track+%03d' % rnd.randint(1, 300),
+             'trackconfigname': rnd.choice(['Full+Course', 'Oval', '']),
+             'carid': 33, 'eventtypename': rnd.choice(['Race', 'Time+Trial']),
+             'seasonyear': rnd.randint(2008, 2016),
+             'seasonquarter': rnd.randint(1, 4),
+             'bestlaptime': rnd.randint(800000, 1200000),
+             'bestlaptimeformatted': lap_time(rnd)} for _ in range(40)]
+
+
+def driver_status(rnd):
+    return {'blRacers': [], 'fsRacers': [], 'searchRacers': [
+        {'custid': 100000 + rnd.randint(0, 400000),
+         'name': 'Driver+%05d' % i, 'lastLogin': 1472688000000 + i,
+         'lastSeen': 1472688000000 + i, 'broadcast': False,
+         'regOpen': False, 'sessionStatus': 'not+in+session',
+         'helmet': {'hp': rnd.randint(1, 60), 'c1': '%06x' % rnd.randint(
+             0, 0xffffff)}} for i in range(5)]}
+
+
+def series_stats(rnd):
+    seasons = [{'seriesid': 200 + i % 200, 'seasonid': 1000 + i,
+                'seriesname': 'Series %03d' % (i % 200),
+                'catid': rnd.choice([1, 2]), 'year': 2008 + i // 200,
+                'quarter': 1 + i // 50 % 4,
+                'cars': [{'name': 'Car %03d' % c, 'id': c} for c in
+                         rnd.sample(range(1, 151), rnd.randint(1, 6))]}
+               for i in range(1800)]
+    lines = ['<!DOCTYPE html>', '<html><head><title>Series Stats</title>']
+    for i in range(200):
+        lines.append('<link rel="stylesheet" href="/css/stats%d.css">' % i)
+    lines.append('<script type="text/javascript">')
+    lines.append("var SeasonListing = extractJSON('%s');" % listing(seasons))
+    lines.append('</script></head><body></body></html>')
+    return '\n'.join(lines)
+
+
+def laps_single(rnd):
+    custid, t, laps = 100037, rnd.randint(0, 50000), []
+    for lap in range(LAPS + 1):
+        laps.append({'custid': custid, 'lap_num': lap,
+                     'flags': rnd.choice([0] * 12 + [2, 4]),
+                     'ses_time': t})
+        t += rnd.randint(850000, 990000)
+    return {'header': {'subsessionid': 15012345, 'trackid': 12,
+                       'carid': 33, 'eventtype': 5, 'start_time':
+                           '2016-09-01+20:00:00'},
+            'drivers': [{'custid': custid, 'displayname': 'Driver+00001',
+                         'carnum': '2', 'bestlaptime': rnd.randint(
+                             850000, 990000), 'bestlapnum': rnd.randint(
+                             1, LAPS), 'groupid': custid}],
+            'lapData': laps}
+
+
+def hosted_results(rnd):
+    return {'rowcount': 312, 'rows': [
+        {'subsessionid': 15100000 + i, 'sessionid': 90000000 + i,
+         'sessionname': 'Session+%03d' % i,
+         'hostdisplayname': 'Driver+%05d' % rnd.randint(0, 99999),
+         'hostcustid': rnd.randint(1, 99999),
+         'start_time': 1472688000000 + i * 3600000,
+         'trackid': rnd.randint(1, 300), 'carids': str(rnd.randint(1, 150)),
+         'winnerdisplayname': 'Driver+%05d' % rnd.randint(0, 99999),
+         'winnercustid': rnd.randint(1, 99999),
+         'winnerlaps': rnd.randint(10, 40),
+         'numdrivers': rnd.randint(2, 40)} for i in range(25)]}
+
+
+def session_times(rnd):
+    rows = [{'start_time': 1472688000000 + i * 7200000,
+             'sessiontypeid': rnd.choice([2, 3, 5]),
+             'seasonid': 2042, 'raceweek': i // 84,
+             'trackid': rnd.randint(1, 300),
+             'registered': rnd.randint(0, 60)} for i in range(84)]
+    header = {str(i + 1): name for i, name in enumerate(rows[0])}
+    keys = {name: key for key, name in header.items()}
+    return {'m': header, 'd': [{keys[name]: value for name, value in
+                                row.items()} for row in rows]}
+
+
+def series_raceresults(rnd):
+    rows = [{'subsessionid': 15000000 + i,
+             'start_time': 1472688000000 + i * 7200000,
+             'sessionid': 90000000 + i, 'carclassid': 74,
+             'trackid': rnd.randint(1, 300), 'raceweek': 3,
+             'officialsession': 1, 'sizeoffield': rnd.randint(6, 40),
+             'strengthoffield': rnd.randint(900, 4000),
+             'winnerdisplayname': 'Driver+%05d' % rnd.randint(0, 99999),
+             'winnercustid': rnd.randint(1, 99999)} for i in range(84)]
+    header = {str(i + 1): name for i, name in enumerate(rows[0])}
+    keys = {name: key for key, name in header.items()}
+    return {'m': header, 'd': [{keys[name]: value for name, value in
+                                row.items()} for row in rows]}
+
+
+def world_records(rnd):
+    # Row 0 is the column totals the site puts before the records
+    rows = [{'rn': i, 'custid': 100000 + rnd.randint(0, 400000),
+             'displayname': 'Driver+%05d' % i, 'carid': 33, 'trackid': 12,
+             'season_year': 2016, 'season_quarter': 3,
+             'practice': '1%%3A%06.3f' % (rnd.random() * 30 + 20),
+             'qualify': '1%%3A%06.3f' % (rnd.random() * 30 + 20),
+             'race': '1%%3A%06.3f' % (rnd.random() * 30 + 20),
+             'timetrial': '1%%3A%06.3f' % (rnd.random() * 30 + 20)}
+            for i in range(2)]
+    return table(list(rows[0]), (rows, 1))
+
+
+def subsession_results(rnd):
+    return {'subsessionid': 15012345, 'sessionid': 90012345,
+            'seasonid': 2042, 'trackid': 12, 'eventtype': 4,
+            'start_time': '2016-09-01+20:00:00', 'rows': [
+                {'custid': 100000 + i * 37, 'displayname': 'Driver+%05d' % i,
+                 'finishpos': i, 'carid': 33, 'simsesnum': 0,
+                 'simsestypename': 'Time+Trial',
+                 'bestlaptime': rnd.randint(850000, 990000),
+                 'bestlapnum': rnd.randint(1, 10),
+                 'lapscomplete': rnd.randint(5, 10),
+                 'incidents': rnd.randint(0, 8),
+                 'oldttrating': rnd.randint(1000, 2000),
+                 'newttrating': rnd.randint(1000, 2000)}
+                for i in range(DRIVERS)]}
+
+
+def main():
+    rnd = random.Random(SEED)
+    os.makedirs(FIXTURES, exist_ok=True)
+    fixtures = {
+        'home.html': home_page(rnd),
+        'career_stats.json': json.dumps(career_stats(rnd)),
+        'yearly_stats.json': json.dumps(yearly_stats(rnd)),
+        'lastrace_stats.json': json.dumps(lastrace_stats(rnd)),
+        'iratingchart.json': json.dumps(irating_chart(rnd)),
+        'driver_search.json': json.dumps(driver_search(rnd)),
+        'results_archive.json': json.dumps(results_archive(rnd)),
+        'event_results.csv': event_csv(rnd),
+        'lapchart.json': json.dumps(lap_chart(rnd)),
+        'event_results2.html': event_results2(rnd),
+        'series.html': series_page(rnd),
+        'season_standings.json': json.dumps(season_standings(rnd)),
+        'personal_best.json': json.dumps(personal_best(rnd)),
+        'driver_status.json': json.dumps(driver_status(rnd)),
+        'series_stats.html': series_stats(rnd),
+        'laps_single.json': json.dumps(laps_single(rnd)),
+        'hosted_results.json': json.dumps(hosted_results(rnd)),
+        'session_times.json': json.dumps(session_times(rnd)),
+        'series_raceresults.json': json.dumps(series_raceresults(rnd)),
+        'world_records.json': json.dumps(world_records(rnd)),
+        'subsession_results.json': json.dumps(subsession_results(rnd)),
+    }
+    for name, data in fixtures.items():
+        with open(os.path.join(FIXTURES, name), 'w', newline='') as f:
+            f.write(data)
+        print('%-24s %8d bytes' % (name, len(data)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+""" Stand-in for the iRacing members site, an asyncio HTTP/1.1 server
+    answering the URL_* endpoints of constants.py with the benchmark
+    fixtures (all but URL_SELECT_SERIES and URL_GET_PASTSERIES, which no
+    client method requests). Latency, errors, session expiry and rate
+    limiting can be configured, so the client can be load tested (see
+    load.py) with no network. Point a client at it through the transport host_map:
+
+        async with MockIRacingServer(latency=(0.02, 0.08)) as server:
+            transport = HTTPTransport(host_map=server.host_map)
+            client = iRWebStats(user, password, log, transport=transport)
+"""
+import asyncio
+import collections
+import itertools
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+from ..constants import URL_CAREER_STATS, URL_CARS_DRIVEN, \
+    URL_CURRENT_SERIES, URL_DRIVER_COUNTS, URL_DRIVER_STATS, \
+    URL_DRIVER_STATUS, URL_GET_EVENTRESULTS, URL_GET_EVENTRESULTS2, \
+    URL_GET_LAPS_ALL, URL_GET_LAPS_SINGLE, URL_GET_SUBSESSRESULTS, \
+    URL_GET_WORLDRECORD, URL_HOSTED_RESULTS, URL_IRACING_HOME, \
+    URL_IRACING_LOGIN, URL_IRACING_LOGIN2, URL_LASTRACE_STATS, \
+    URL_PERSONAL_BEST, URL_RESULTS_ARCHIVE, URL_SEASON_STANDINGS, \
+    URL_SEASON_STANDINGS2, URL_SERIES_RACERESULTS, URL_SESSION_TIMES, \
+    URL_STATS_CHART, URL_YEARLY_STATS
+from ..util import find_key
+from .suite import load_fixtures
+
+SITE = 'https://members.iracing.com'
+SESSION_COOKIE = 'irsso_members'
+REASONS = {200: 'OK', 302: 'Found', 404: 'Not Found', 429:
+           'Too Many Requests', 500: 'Internal Server Error'}
+LOGIN_PAGE = b'<html><body><form action="/membersite/Login" method="post">' \
+             b'</form></body></html>'
+
+
+def path(url):
+    return urlsplit(url).path
+
+
+class MockIRacingServer:
+    """ latency is the delay of every response in seconds, a number or a
+        (min, max) range picked at random. error_rate is the share of
+        requests answered with a 500. Sessions expire session_ttl seconds
+        after login (None never): requests then get redirected to the login
+        page, like the site does. rate and burst enable a token bucket over
+        all requests, answering 429 when empty. Search results report
+        total_results rows (so iter_* sweeps that many pages of the 25
+        fixture rows). """
+
+    def __init__(self, latency=0, error_rate=0, session_ttl=None, rate=None,
+                 burst=10, total_results=250, seed=None):
+        self.latency = latency if isinstance(latency, (tuple, list)) \
+            else (latency, latency)
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self.random = random.Random(seed)
+        self.sessions = {}  # token: login time
+        self._tokens_seq = itertools.count(1)
+        self.requests = collections.Counter()  # By path
+        self.statuses = collections.Counter()
+        self.logins = 0
+        self.server = None
+        self._connections = {}  # Handler task: writer
+        self.port = None
+        self.started_at = None
+        self.routes = self._routes(load_fixtures(), total_results)
+
+    @staticmethod
+    def _routes(files, total_results):
+        """ {path: (content type, body)} of the endpoints. """
+        def table(name):
+            res = json.loads(files[name])
+            res['d'][find_key(res['m'], 'rowcount')] = total_results
+            return json.dumps(res).encode()
+
+        def rows(name):
+            res = json.loads(files[name])
+            res['rowcount'] = total_results
+            return json.dumps(res).encode()
+
+        as_json = 'application/json;charset=UTF-8'
+        html = 'text/html;charset=UTF-8'
+        return {
+            path(URL_IRACING_LOGIN): (html, LOGIN_PAGE),
+            path(URL_CURRENT_SERIES): (html, files['series.html']),
+            path(URL_DRIVER_COUNTS): (as_json, b'{"notifications":0,'
+                                               b'"myracers":[]}'),
+            path(URL_CAREER_STATS): (as_json, files['career_stats.json']),
+            path(URL_YEARLY_STATS): (as_json, files['yearly_stats.json']),
+            path(URL_LASTRACE_STATS): (as_json,
+                                       files['lastrace_stats.json']),
+            path(URL_STATS_CHART): (as_json, files['iratingchart.json']),
+            path(URL_CARS_DRIVEN): (as_json, b'[1,33,67]'),
+            path(URL_PERSONAL_BEST): (as_json, files['personal_best.json']),
+            path(URL_DRIVER_STATUS): (as_json, files['driver_status.json']),
+            path(URL_DRIVER_STATS): (as_json, table('driver_search.json')),
+            path(URL_SEASON_STANDINGS): (as_json,
+                                         table('season_standings.json')),
+            path(URL_SEASON_STANDINGS2): (html, files['series_stats.html']),
+            path(URL_RESULTS_ARCHIVE): (as_json,
+                                        table('results_archive.json')),
+            path(URL_HOSTED_RESULTS): (as_json, rows('hosted_results.json')),
+            path(URL_SESSION_TIMES): (as_json, files['session_times.json']),
+            path(URL_SERIES_RACERESULTS): (as_json,
+                                           files['series_raceresults.json']),
+            path(URL_GET_WORLDRECORD): (as_json, files['world_records.json']),
+            path(URL_GET_EVENTRESULTS): ('text/csv',
+                                         files['event_results.csv']),
+            path(URL_GET_EVENTRESULTS2): (html, files['event_results2.html']),
+            path(URL_GET_SUBSESSRESULTS): (as_json,
+                                           files['subsession_results.json']),
+            path(URL_GET_LAPS_SINGLE): (as_json, files['laps_single.json']),
+            path(URL_GET_LAPS_ALL): (as_json, files['lapchart.json']),
+            path(URL_IRACING_HOME): (html, files['home.html']),
+        }
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.port
+
+    @property
+    def host_map(self):
+        """ HTTPTransport host_map sending the site requests here. """
+        return {SITE: self.url}
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.started_at = time.monotonic()
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # Closing idle keep-alive connections ends their handlers
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at \
+            else 0
+        total = sum(self.requests.values())
+        return {'requests': total, 'logins': self.logins,
+                'requests_per_sec': total / elapsed if elapsed else 0,
+                'statuses': dict(self.statuses),
+                'paths': dict(self.requests)}
+
+    # HTTP
+
+    async def _connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get('content-length', 0)))
+                status, extra, content = await self.handle(
+                    method, target, headers, body)
+                head = ['HTTP/1.1 %d %s' % (status, REASONS.get(status, '')),
+                        'Content-Length: %d' % len(content)]
+                head += ['%s: %s' % item for item in extra]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() +
+                             content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    def _limited(self):
+        if self.rate is None:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens +
+                           (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def _session(self, headers):
+        """ Returns whether the request has a valid session cookie. """
+        cookie = headers.get('cookie', '')
+        for part in cookie.replace(',', ';').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE and value in self.sessions:
+                if self.session_ttl is None or time.monotonic() - \
+                        self.sessions[value] < self.session_ttl:
+                    return True
+        return False
+
+    async def handle(self, method, target, headers, body):
+        """ Returns (status, [(header, value)], body) of a request. """
+        route = urlsplit(target).path
+        self.requests[route] += 1
+        status, extra, content = self._respond(method, route, headers)
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(self.random.uniform(low, high))
+        self.statuses[status] += 1
+        return status, extra, content
+
+    def _respond(self, method, route, headers):
+        if self._limited():
+            return 429, [], b'Too many requests'
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 500, [], b'Internal Server Error'
+        session = [('Set-Cookie', 'JSESSIONID=%d; Path=/' %
+                    self.random.randrange(10 ** 9))]
+        if route == path(URL_IRACING_LOGIN2) and method == 'POST':
+            token = 'mock%d' % next(self._tokens_seq)
+            self.sessions[token] = time.monotonic()
+            self.logins += 1
+            return 302, [('Location', path(URL_IRACING_HOME)),
+                         ('Set-Cookie', '%s=%s; Path=/' % (SESSION_COOKIE,
+                                                           token))], b''
+        if route not in self.routes:
+            return 404, [], b'Not found'
+        content_type, content = self.routes[route]
+        if route != path(URL_IRACING_LOGIN):
+            if not self._session(headers):
+                return 302, [('Location', path(URL_IRACING_LOGIN))], b''
+            if route == path(URL_IRACING_HOME):
+                content = b'<script>var js_custid = 100037;</script>' + \
+                    content
+        return 200, [('Content-Type', content_type)] + session, content
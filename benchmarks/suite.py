@@ -0,0 +1,305 @@
+""" Offline benchmarks of the response parsing paths, run on the fixtures
+    (see make_fixtures.py) with no network. Prints a JSON report to stdout
+    (or --output) with the time per call of every case, which --compare
+    turns into a table of ratios against a previous report:
+
+        python -m <package>.benchmarks.suite --output new.json
+        python -m <package>.benchmarks.suite --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from ..cache import ResponseCache
+from ..client import iRWebStats
+from ..constants import URL_CURRENT_SERIES, URL_GET_EVENTRESULTS, \
+    URL_GET_EVENTRESULTS2
+from ..ratelimit import RateLimiter
+from ..responses.career_stats import CareerStats
+from ..responses.last_races_stats import LastRacesStats
+from ..responses.result_set import ResultSet
+from ..responses.series import Series
+from ..responses.yearly_stats import YearlyStats
+from ..transport import HTTPTransport
+from ..util import Content, decode_listing, extract_listings, find_key, \
+    format_results, parse
+from . import logged_in
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+REPEAT = 5  # Runs of each case, the report keeps min, median and mean
+MIN_TIME = 0.2  # Seconds a run lasts at least (calls are added to reach it)
+
+CASES = {}
+
+
+def case(name):
+    """ Registers a benchmark. The decorated function gets the fixtures
+        and returns what to time: a function, or a coroutine function
+        (awaited in an event loop). """
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def load_fixtures():
+    """ {file name: bytes} of every fixture. """
+    files = {}
+    for name in os.listdir(FIXTURES):
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+
+class FixtureTransport(HTTPTransport):
+    """ HTTPTransport answering every request with the fixture routed to
+        the url (routes maps url prefixes to (content type, body)). """
+
+    def __init__(self, routes):
+        super().__init__()
+        self.routes = routes
+
+    def handle(self, request):
+        url = str(request.url)
+        for prefix, (content_type, body) in self.routes.items():
+            if url.startswith(prefix):
+                return httpx.Response(200, content=body, headers={
+                    'Content-Type': content_type})
+        return httpx.Response(404)
+
+    async def open(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=httpx.MockTransport(self.handle))
+        return self
+
+
+def offline_client(routes):
+    """ A logged in iRWebStats served by FixtureTransport, with no rate
+        limit nor cache so each call goes through the full request path. """
+    client = iRWebStats('benchmark', 'benchmark',
+                        logging.getLogger('benchmark'),
+                        rate_limiter=RateLimiter(rate=1e9, burst=1e9),
+                        transport=FixtureTransport(routes),
+                        cache=ResponseCache({}))
+    client.logged = True
+    client.custid = 100037
+    return client
+
+
+def prefix(url):
+    return url.split('?')[0].split('%')[0]
+
+
+# parse
+
+for _name in ('career_stats', 'iratingchart', 'lapchart', 'driver_search'):
+    def _parse_case(files, _name=_name):
+        content = Content(files[_name + '.json'], 'utf-8')
+        return lambda: parse(content)
+    case('parse.' + _name)(_parse_case)
+
+
+# Search results
+
+@case('format_results.driver_search')
+def _(files):
+    res = json.loads(files['driver_search.json'])
+    return lambda: format_results(res['d']['r'], res['m'])
+
+
+@case('result_set.driver_search')
+def _(files):
+    res = json.loads(files['driver_search.json'])
+    return lambda: ResultSet(res['d']['r'], res['m']).to_dicts()
+
+
+@case('result_set.results_archive')
+def _(files):
+    res = json.loads(files['results_archive.json'])
+
+    def build():
+        header = res['m']
+        total = res['d'][find_key(header, 'rowcount')]
+        return ResultSet(res['d']['r'], header), total
+    return build
+
+
+# Home page / catalogs
+
+@case('extract_listings.home')
+def _(files):
+    home = files['home.html'].decode('utf-8')
+    return lambda: extract_listings(home)
+
+
+@case('get_irservice_info.home')
+def _(files):
+    home = files['home.html'].decode('utf-8')
+    client = offline_client({})
+    client.log.disabled = True
+    return lambda: client._iRWebStats__get_irservice_info(home)
+
+
+# Client paths over the fixture transport
+
+@case('event_results.csv')
+def _(files):
+    client = offline_client({prefix(URL_GET_EVENTRESULTS): (
+        'text/csv', files['event_results.csv'])})
+    return lambda: client.event_results(15012345)
+
+
+@case('event_results2.html')
+def _(files):
+    client = offline_client({prefix(URL_GET_EVENTRESULTS2): (
+        'text/html', files['event_results2.html'])})
+    return lambda: client.event_results2(15012345, 100037)
+
+
+@case('current_series_images.html')
+def _(files):
+    client = offline_client({prefix(URL_CURRENT_SERIES): (
+        'text/html', files['series.html'])})
+    return client.current_series_images
+
+
+# Models
+
+@case('models.career_stats')
+def _(files):
+    stats = json.loads(files['career_stats.json'])
+    return lambda: CareerStats.from_list(stats)
+
+
+@case('models.yearly_stats')
+def _(files):
+    stats = json.loads(files['yearly_stats.json'])
+    return lambda: YearlyStats.from_list(stats)
+
+
+@case('models.lastrace_stats')
+def _(files):
+    stats = json.loads(files['lastrace_stats.json'])
+    return lambda: LastRacesStats.from_list(stats)
+
+
+@case('models.series')
+def _(files):
+    home = files['home.html'].decode('utf-8')
+    seasons = decode_listing(extract_listings(home, ('SeasonListing',))[
+        'SeasonListing'][0])
+    return lambda: Series.from_list(seasons)
+
+
+def measure(func, repeat=REPEAT, min_time=MIN_TIME):
+    """ Returns the seconds per call of each run. A run calls func
+        (awaiting it when it's a coroutine) enough times to last
+        min_time. """
+
+    async def timed(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            result = func()
+            if asyncio.iscoroutine(result):
+                await result
+        return time.perf_counter() - start
+
+    async def runs():
+        number, elapsed = 1, await timed(1)  # Also warms up
+        while elapsed < min_time:
+            number *= 2 if elapsed <= 0 else \
+                max(2, min(10, int(min_time / elapsed) + 1))
+            elapsed = await timed(number)
+        times = [elapsed / number]
+        for _ in range(repeat - 1):
+            times.append(await timed(number) / number)
+        return number, times
+
+    return asyncio.run(runs())
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None, repeat=REPEAT, min_time=MIN_TIME):
+    """ Runs the cases whose name contains any of names (all if None) and
+        returns the report. """
+    files = load_fixtures()
+    logging.getLogger('benchmark').setLevel(logging.WARNING)
+    results = {}
+    for name, setup in sorted(CASES.items()):
+        if names and not any(n in name for n in names):
+            continue
+        number, times = measure(setup(files), repeat, min_time)
+        results[name] = {'min': min(times),
+                         'median': statistics.median(times),
+                         'mean': statistics.mean(times),
+                         'number': number, 'repeat': repeat}
+    if not names or any(n in 'logged_in' for n in names):
+        for name, seconds in logged_in.run().items():
+            results['logged_in.' + name] = {'min': seconds,
+                                            'median': seconds,
+                                            'mean': seconds,
+                                            'number': None,
+                                            'repeat': 1}
+    return {'commit': git_commit(), 'time': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(), 'results': results}
+
+
+def compare(old, new):
+    """ Table of the median times of two reports and their ratio. """
+    lines = ['%-36s %12s %12s %7s' % ('case', 'old (us)', 'new (us)',
+                                      'new/old')]
+    for name in sorted(set(old['results']) | set(new['results'])):
+        a = old['results'].get(name, {}).get('median')
+        b = new['results'].get(name, {}).get('median')
+        ratio = '%7.2f' % (b / a) if a and b else '%7s' % '-'
+        lines.append('%-36s %12s %12s %s' % (
+            name, '-' if a is None else '%.2f' % (a * 1e6),
+            '-' if b is None else '%.2f' % (b * 1e6), ratio))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help='only run cases containing any of these')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='previous JSON report to compare '
+                                          'with (printed to stderr)')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    args = parser.parse_args(argv)
+
+    report = run(args.names, args.repeat, args.min_time)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
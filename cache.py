@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """ In-memory LRU cache of raw responses keyed on (endpoint, params).
+        Each endpoint has its own time to live (ttls maps an endpoint url,
+        without query string, to seconds); endpoints without a ttl are
+        never cached. At most maxsize entries are kept, the least recently
+        used one is evicted first. """
+
+    def __init__(self, ttls=None, maxsize=1024):
+        self.ttls = dict(ttls or {})
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    @staticmethod
+    def endpoint(url):
+        return url.split('?', 1)[0]
+
+    @staticmethod
+    def key(method, url, data=None):
+        params = tuple(sorted((str(k), str(v)) for k, v in data.items())) \
+            if data else ()
+        return method, url, params
+
+    def ttl(self, url):
+        return self.ttls.get(self.endpoint(url))
+
+    def get(self, key):
+        """ Returns the cached value for key or None if missing/expired. """
+        item = self._data.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        ttl = self.ttl(key[1])
+        if not ttl:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, url=None):
+        """ Drops cached entries. With no url everything is dropped, a url
+            without query string drops the whole endpoint and a full url
+            drops only that request. """
+        if url is None:
+            self._data.clear()
+            return
+        for key in list(self._data):
+            if key[1] == url or self.endpoint(key[1]) == url:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
@@ -0,0 +1,52 @@
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+# Snapshot layout: header (magic, format version, marshal version, saved at)
+# followed by the marshalled {name: listing} dict.
+MAGIC = b'IRWC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHd')
+
+
+def save_catalog(path, catalog, saved_at=None):
+    """ Writes the catalogs (i.e {'TRACKS': {...}, 'CARS': {...}}) to a
+        snapshot file. The file is written aside and renamed into place so
+        readers never see a partial snapshot. """
+    saved_at = time.time() if saved_at is None else saved_at
+    header = HEADER.pack(MAGIC, VERSION, marshal.version, saved_at)
+    data = marshal.dumps(catalog)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.catalog')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_catalog(path):
+    """ Loads a snapshot written by save_catalog. Returns a tuple
+        (saved_at, catalog) or None if the file is missing or was written
+        by another format/Python version. """
+    try:
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < HEADER.size:
+                return None
+            magic, version, marshal_version, saved_at = \
+                HEADER.unpack_from(mm)
+            if (magic, version, marshal_version) != \
+                    (MAGIC, VERSION, marshal.version):
+                return None
+            with memoryview(mm)[HEADER.size:] as view:  # No copy
+                catalog = marshal.loads(view)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return saved_at, catalog
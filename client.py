@@ -8,14 +8,12 @@ import urllib
 import urllib.parse
 
 encode = urllib.parse.urlencode
-from io import StringIO
 
-import requests_async as requests
+import asyncio
+import codecs
 import datetime
-import csv
 import time
 import re
-import sys
 
 from .util import *
 from .responses.series import Series
@@ -23,6 +21,17 @@ from .constants import *
 from .responses.last_races_stats import LastRacesStats
 from .responses.career_stats import CareerStats
 from .responses.yearly_stats import YearlyStats
+from .responses.result_set import ResultSet
+from .responses.irating_series import IRatingSeries
+from .ratelimit import RateLimiter
+from .transport import HTTPTransport
+from .cache import ResponseCache
+from .catalog import load_catalog, save_catalog
+from .session_store import FileSessionStore
+from .sync import sync_results_archive
+from .planner import QueryPlanner
+from .laps import LapChart
+from .metrics import ClientMetrics, endpoint
 
 
 class iRWebStats:
@@ -32,38 +41,78 @@ class iRWebStats:
         are required. Most  data is returned in JSON format and
         converted to python dicts. """
 
-    def __init__(self, username, password, log):
+    def __init__(self, username, password, log, rate_limiter=None,
+                 transport=None, cache=None, catalog_path=None,
+                 catalog_max_age=CATALOG_MAX_AGE, session_store=None,
+                 warehouse=None, metrics=None):
         self.username = username
         self.password = password
         self.last_cookie = ''
         self.logged = False
         self.custid = 0
         self.log = log
+        # Saved login sessions, shared by every client/process using it
+        self.session_store = session_store or FileSessionStore()
         self.TRACKS, self.CARS, self.DIVISION, self.CARCLASS, self.CLUB = {}, \
                                                                           {}, {}, {}, {}
-        self.last_request_at = None
+        # Pass the same RateLimiter to several clients to share the limit
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # A transport passed in is shared, so we leave closing it to the owner
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport()
+        # Responses of endpoints in CACHE_TTL are reused until they expire
+        self.cache = cache if cache is not None else \
+            ResponseCache(CACHE_TTL, CACHE_SIZE)
+        self._inflight = {}  # Requests being sent, shared by equal callers
+        self._login_lock = asyncio.Lock()
+        self._session_generation = 0  # Increased by every login
+        # Snapshot file of self.TRACKS, self.CARS, etc. (see catalog.py)
+        self.catalog_path = catalog_path
+        self.catalog_max_age = catalog_max_age
+        self._catalog_refresh = None
+        # Optional warehouse.Warehouse where fetched results are saved, and
+        # the planner answering the searches it already holds from it
+        self.warehouse = warehouse
+        self.planner = QueryPlanner(warehouse) if warehouse is not None \
+            else None
+        # Per endpoint counters and histograms, kept in the metrics registry
+        # (metrics.MetricsRegistry) given or in one of our own
+        self.metrics = ClientMetrics(metrics)
+
+    async def __aenter__(self):
+        await self.transport.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def close(self):
+        """ Closes the pooled HTTP session if this client created it, after
+            cancelling a catalog refresh still under way. """
+        task = self._catalog_refresh
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._owns_transport:
+            await self.transport.close()
 
     async def __save_cookie(self):
-        """ Saves the current cookie to disk from a successful login to avoid
-            future login procedures and save time. A cookie usually last
-            at least a couple of hours """
+        """ Saves the current cookie to the session store from a successful
+            login to avoid future login procedures and save time. A cookie
+            usually last at least a couple of hours """
 
         self.log.info("Saving cookie for future use")
-        o = open('cookie.tmp', 'w')
-        o.write(self.last_cookie)
-        o.write('\n' + str(self.custid))
-        o.close()
+        self.session_store.save(self.username, self.last_cookie, self.custid)
 
     async def __load_cookie(self):
         """ Loads a previously saved cookie """
         self.log.info('Attempting to load cookie')
-        try:
-            o = open('cookie.tmp', 'r')
-            self.last_cookie, self.custid = o.read().split('\n')
-            o.close()
-            return True
-        except:
+        session = self.session_store.load(self.username)
+        if session is None:
             return False
+        self.last_cookie, self.custid = session
+        return True
 
     async def login(self, get_info=False):
         """ Log in to iRacing members site. If there is a valid cookie saved
@@ -73,6 +122,19 @@ class iRWebStats:
 
         if self.logged:
             return True
+        return await self.__locked_login(get_info)
+
+    async def __locked_login(self, get_info):
+        # Held across processes: others using the same credentials wait here
+        # and then reuse the session we save instead of logging in again
+        lock = self.session_store.lock(self.username)
+        await asyncio.get_event_loop().run_in_executor(None, lock.__enter__)
+        try:
+            return await self.__login(get_info)
+        finally:
+            lock.__exit__(None, None, None)
+
+    async def __login(self, get_info):
         data = {"username": self.username, "password": self.password, 'utcoffset': 300,
                 'todaysdate': ''}
         try:
@@ -82,13 +144,11 @@ class iRWebStats:
                 #  If previous cookie is valid
                 self.log.info("Previous cookie valid")
                 self.logged = True
+                self._session_generation += 1
                 if get_info:
                     # Load iracing info
-                    self.__get_irservice_info(await self.__req(URL_IRACING_HOME,
-                                                         cookie=self.last_cookie))
-                # TODO Should we cache this?
+                    await self.__load_info()
                 return self.logged
-            self.custid = ''
             r = await self.__req(URL_IRACING_LOGIN, grab_cookie=True)
             r = await self.__req(URL_IRACING_LOGIN2, data,
                            cookie=self.last_cookie, grab_cookie=True)
@@ -99,7 +159,8 @@ class iRWebStats:
                 self.custid = custid
                 self.log.info("CUSTID: " + str(self.custid))
                 self.logged = True
-                self.__get_irservice_info(r)
+                self._session_generation += 1
+                await self.__load_info(r)
                 await self.__save_cookie()
                 self.log.info("Log in successful")
             else:
@@ -117,77 +178,229 @@ class iRWebStats:
     async def __check_cookie(self):
         """ Checks the cookie by testing a request response"""
 
-        r = parse(await self.__req(URL_DRIVER_COUNTS, cookie=self.last_cookie))
+        r = parse(await self.__req(URL_DRIVER_COUNTS, cookie=self.last_cookie,
+                                   binary=True, retry=False))
         if isinstance(r, dict):
             return True
         return False
 
     async def __req(self, url, data=None, cookie=None, grab_cookie=False,
-                    useget=False):
-        """ Creates and sends the HTTP requests to iRacing site """
-
-        # Sleep/wait to avoid flooding the service with requests
-        if self.last_request_at:
-            self.log.info('Time difference: ' + str(time.perf_counter() - self.last_request_at))
-            while (time.perf_counter() - self.last_request_at) < WAIT_TIME:
+                    useget=False, binary=False, retry=True):
+        """ Creates and sends the HTTP requests to iRacing site. Identical
+            requests already in flight are not sent again, callers share
+            the response of the first one. Returns the response text or the
+            raw bytes if binary is True (what parse() works best with). A
+            response redirected to the login page means the session
+            expired: the client logs in again (see relogin) and the request
+            is replayed once. retry=False sends it once and doesn't wait for
+            a login under way (for the requests made while logging in). """
+
+        useget = (data is None) or useget
+        if grab_cookie:  # Login requests are never shared nor cached
+            content = await self.__send(url, data, cookie, grab_cookie, useget)
+            return content if binary else decode(content)
+
+        if retry:
+            await self.__login_done()
+        generation = self._session_generation
+        content = await self.__shared(url, data, cookie, useget)
+        if content.expired and retry and \
+                await self.__session_expired(url, generation):
+            content = await self.__shared(url, data, cookie, useget)
+        return content if binary else decode(content)
+
+    async def __shared(self, url, data, cookie, useget):
+        """ Response Content of the request, from the cache or shared with
+            an equal request in flight when possible. """
+
+        key = self.cache.key('GET' if useget else 'POST', url, data)
+        cacheable = bool(self.cache.ttl(url))
+        if cacheable:
+            content = self.cache.get(key)
+            if content is not None:
+                self.metrics.cache_hits.inc(endpoint=endpoint(url))
+                return content
+            self.metrics.cache_misses.inc(endpoint=endpoint(url))
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self.__send(
+                url, data, cookie, False, useget,
+                key if cacheable else None))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda t: self.__request_done(key, t))
+        else:
+            self.log.info('Sharing in-flight request to ' + url)
+        # Shielded so a cancelled caller doesn't cancel the other waiters
+        return await asyncio.shield(inflight)
+
+    def __request_done(self, key, task):
+        self._inflight.pop(key, None)
+        # Callers get the error through shield(). Mark it retrieved in case
+        # they were all cancelled, so it isn't logged as never retrieved.
+        if not task.cancelled():
+            task.exception()
+
+    async def __req_json(self, url, data=None, useget=False, retry=True):
+        """ Sends the request (see __req) and parses its JSON response. """
+
+        return self.__parse(url, await self.__req(
+            url, data, useget=useget, binary=True, retry=retry))
+
+    async def __login_done(self):
+        """ Waits for the re-login under way, if any. """
+        if self._login_lock.locked():
+            async with self._login_lock:
                 pass
 
-        self.last_request_at = time.perf_counter()
+    async def __session_expired(self, url, generation):
+        """ Logs in again after a request to url found the session expired
+            (generation being the one it was sent with). Returns whether
+            the request can be replayed. """
+
+        self.log.info('Session expired, trying to log in again')
+        self.cache.invalidate(url)
+        if await self.relogin(generation):
+            self.metrics.retries.inc(endpoint=endpoint(url))
+            return True
+        return False
+
+    def __parse(self, url, content):
+        start = time.perf_counter()
+        res = parse(content)
+        self.metrics.parse.observe(time.perf_counter() - start,
+                                   endpoint=endpoint(url))
+        return res
+
+    async def relogin(self, generation=None):
+        """ Logs in again after the session expired. Concurrent callers
+            share a single login: pass the self._session_generation seen
+            when the failed request was sent and, if a login has completed
+            since then, its session is reused without logging in again.
+            self.logged stays True meanwhile (requests wait for the login
+            to end) and is only cleared if the login fails. """
+
+        async with self._login_lock:
+            if generation is None or generation == self._session_generation:
+                self.metrics.relogins.inc()
+                await self.__locked_login(False)
+            return self.logged
+
+    async def __send(self, url, data, cookie, grab_cookie, useget,
+                     cache_key=None):
+        # Wait for our turn to avoid flooding the service with requests
+        label = endpoint(url)
+        waited = await self.rate_limiter.acquire()
+        self.metrics.rate_limit_wait.observe(waited, endpoint=label)
+        if waited:
+            self.log.info('Rate limited for %.3fs (%d queued)'
+                          % (waited, self.rate_limiter.queue_depth))
+
         h = HEADERS.copy()
         if cookie is not None:  # Send the cookie
             h['Cookie'] = cookie
         elif len(self.last_cookie):
             h['Cookie'] = self.last_cookie
 
-        if (data is None) or useget:
-            self.log.info('get request being sent')
-            self.log.info('url: ' + url)
-            resp = await requests.get(url, headers=h, params=data)
-        else:
-            h['Content-Type'] = 'application/x-www-form-urlencoded;\
+        method = 'GET' if useget else 'POST'
+        start = time.perf_counter()
+        try:
+            if useget:
+                self.log.info('get request being sent')
+                self.log.info('url: ' + url)
+                resp = await self.transport.request('GET', url, headers=h,
+                                                    params=data)
+            else:
+                h['Content-Type'] = 'application/x-www-form-urlencoded;\
                     charset=UTF-8'
-            resp = await requests.post(url, data=data, headers=h)
+                resp = await self.transport.request('POST', url, headers=h,
+                                                    data=data)
+        except Exception:
+            self.metrics.requests.inc(endpoint=label, method=method,
+                                      status='error')
+            raise
+        self.metrics.latency.observe(time.perf_counter() - start,
+                                     endpoint=label)
+        self.metrics.requests.inc(endpoint=label, method=method,
+                                  status=resp.status_code)
+        self.metrics.bytes.observe(len(resp.content), endpoint=label)
         if 'Set-Cookie' in resp.headers and grab_cookie:
             self.last_cookie = resp.headers['Set-Cookie']
             # Must get irsso_members from another header
             if 'cookie' in resp.request.headers:
                 resp_req_cookie = resp.request.headers['cookie']
                 self.last_cookie += ';' + resp_req_cookie
-        html = resp.text
-        return html
+        content = Content(resp.content, resp.encoding,
+                          not grab_cookie and at_login_page(resp))
+        # Redirects mean the session expired, don't keep the login page
+        if cache_key is not None and resp.status_code == 200 \
+                and not resp.history:
+            self.cache.set(cache_key, content)
+        return content
+
+    async def __load_info(self, resp=None):
+        """ Loads the iracing info (self.TRACKS, self.CARS, etc.) from the
+            snapshot at catalog_path if there's one, refreshing it when
+            older than catalog_max_age: from resp if given, otherwise in the
+            background. With no snapshot it's parsed from resp (the home
+            page, downloaded if None). """
+
+        snapshot = load_catalog(self.catalog_path) if self.catalog_path \
+            else None
+        if snapshot is None:
+            await self.refresh_info(resp)
+            return
+        saved_at, catalog = snapshot
+        for name, o in catalog.items():
+            setattr(self, name, o)
+        if time.time() - saved_at <= self.catalog_max_age:
+            return
+        if resp is not None:  # The home page is already here
+            await self.refresh_info(resp)
+        elif self._catalog_refresh is None:
+            self.log.info("iRacing info snapshot is stale, refreshing")
+            self._catalog_refresh = asyncio.ensure_future(self.refresh_info())
+
+    async def refresh_info(self, resp=None):
+        """ Gets the iracing info from the home page (resp, downloaded if
+            None) and saves the snapshot at catalog_path if set. """
+
+        try:
+            if resp is None:
+                resp = await self.__req(URL_IRACING_HOME, retry=False)
+            catalog = self.__get_irservice_info(resp)
+            if self.catalog_path and catalog:
+                save_catalog(self.catalog_path, catalog)
+        except Exception as e:
+            self.log.info("Error refreshing iRacing info " + str(e))
+        finally:
+            if self._catalog_refresh is asyncio.current_task():
+                self._catalog_refresh = None
 
     def __get_irservice_info(self, resp):
         """ Gets general information from iracing service like current tracks,
             cars, series, etc. Check self.TRACKS, self.CARS, self.DIVISION
-            , self.CARCLASS, self.CLUB. """
+            , self.CARCLASS, self.CLUB. Returns the ones found by name. """
 
         self.log.info("Getting iRacing Service info (cars, tracks, etc.)")
-        items = {"TRACKS": "TrackListing", "CARS": "CarListing",
-                 "CARCLASS": "CarClassListing", "CLUBS": "ClubListing",
-                 "SEASON": "SeasonListing", "DIVISION": "DivisionListing",
-                 "YEARANDQUARTER": "YearAndQuarterListing"}
+        items = IRSERVICE_LISTINGS
+        listings = extract_listings(resp, items.values())
+        found = {}
         for i in items:
-            str2find = "var " + items[i] + " = extractJSON('"
             try:
-                ind1 = resp.index(str2find)
-                json_o = resp[ind1 + len(str2find): resp.index("');", ind1)] \
-                    .replace('+', ' ')
-                o = json.loads(json_o)
+                o = decode_listing(listings[items[i]][0])
                 if i not in ("SEASON", "YEARANDQUARTER"):
                     o = {ele['id']: ele for ele in o}
                 setattr(self, i, o)  # i.e self.TRACKS = o
+                found[i] = o
 
             except Exception as e:
                 self.log.info("Error ocurred. Couldn't get {}".format(i))
+        return found
 
     def _load_irservice_var(self, varname, resp, appear=1):
-        str2find = "var " + varname + " = extractJSON('"
-        ind1 = -1
-        for _ in range(appear):
-            ind1 = resp.index(str2find, ind1 + 1)
-        json_o = resp[ind1 + len(str2find): resp.index("');", ind1)] \
-            .replace('+', ' ')
-        o = json.loads(json_o)
+        raw = extract_listings(resp, (varname,))[varname][appear - 1]
+        o = decode_listing(raw)
         if varname not in ("SeasonListing", "YEARANDQUARTER"):
             o = {ele['id']: ele for ele in o}
         return o
@@ -197,100 +410,73 @@ class iRWebStats:
         """ Gets the irating data of a driver using its custom id (custid)
             that generates the chart located in the driver's profile. """
 
-        r = await self.__req(URL_STATS_CHART % (custid, category),
-                             cookie=self.last_cookie)
-        parsed_iratings = parse(r)
-
-        if parsed_iratings == '' and retry:
-            self.log.info('trying to log in again')
-            self.logged = False
-            await self.login()
-            return await self.iratingchart(custid, category, False)
-        elif not parsed_iratings:
+        parsed_iratings = await self.__req_json(
+            URL_STATS_CHART % (custid, category), retry=retry)
+        if not parsed_iratings:
             return []
 
         return parsed_iratings
 
+    @logged_in
+    async def irating_series(self, custid=None, category=IRATING_ROAD_CHART):
+        """ iratingchart of a driver as an IRatingSeries (NumPy arrays with
+            vectorized analytics). Needs numpy. """
+        return IRatingSeries.from_chart(
+            await self.iratingchart(custid, category))
+
     @logged_in
     async def driver_counts(self):
         """ Gets list of connected myracers and notifications. """
-        r = await self.__req(URL_DRIVER_COUNTS, cookie=self.last_cookie)
-        return parse(r)
+        return await self.__req_json(URL_DRIVER_COUNTS)
 
     @logged_in
     async def career_stats(self, custid=None, retry=True):
         """ Gets career stats (top5, top 10, etc.) of driver (custid)."""
-        r = await self.__req(URL_CAREER_STATS % (custid),
-                             cookie=self.last_cookie)
-        career_stats_dict = parse(r)
-        if career_stats_dict == '' and retry:
-            self.log.info('trying to login again')
-            self.logged = False
-            await self.login()
-            return await self.career_stats(custid, False)
-        elif not career_stats_dict:
+        career_stats_dict = await self.__req_json(URL_CAREER_STATS % (custid),
+                                                  retry=retry)
+        if not career_stats_dict:
             return []
 
-        return map(lambda x: CareerStats(x), career_stats_dict)
+        return CareerStats.from_list(career_stats_dict)
 
     @logged_in
     async def yearly_stats(self, custid=None, retry=True):
         """ Gets yearly stats (top5, top 10, etc.) of driver (custid)."""
-        r = await self.__req(URL_YEARLY_STATS % (custid),
-                             cookie=self.last_cookie)
-        yearly_stats_dict = parse(r)
-        if yearly_stats_dict == '' and retry:
-            self.log.info('trying to log in again')
-            self.logged = False
-            await self.login()
-            return await self.yearly_stats(custid, False)
-        elif not yearly_stats_dict:
+        yearly_stats_dict = await self.__req_json(URL_YEARLY_STATS % (custid),
+                                                  retry=retry)
+        if not yearly_stats_dict:
             return []
 
-        return map(lambda x: YearlyStats(x), yearly_stats_dict)
+        return YearlyStats.from_list(yearly_stats_dict)
 
     @logged_in
     async def cars_driven(self, custid=None):
         """ Gets list of cars driven by driver (custid)."""
-        r = await self.__req(URL_CARS_DRIVEN % (custid),
-                             cookie=self.last_cookie)
-        # tofile(r)
-        return parse(r)
+        return await self.__req_json(URL_CARS_DRIVEN % (custid))
 
     @logged_in
     async def personal_best(self, custid=None, carid=0):
         """ Personal best times of driver (custid) using car
             (carid. check self.CARS) set in official events."""
-        r = await self.__req(URL_PERSONAL_BEST % (carid, custid),
-                             cookie=self.last_cookie)
-        return parse(r)
+        return await self.__req_json(URL_PERSONAL_BEST % (carid, custid))
 
     @logged_in
     async def driverdata(self, drivername):
         """ Personal data of driver  using its name in the request
             (i.e drivername="Victor Beltran"). """
 
-        r = await self.__req(URL_DRIVER_STATUS % (encode({
-            'searchTerms': drivername})), cookie=self.last_cookie)
-        # tofile(r)
-        return parse(r)
+        return await self.__req_json(URL_DRIVER_STATUS % (encode({
+            'searchTerms': drivername})))
 
     @logged_in
     async def lastrace_stats(self, custid=None, retry=True):
         """ Gets stats of last races (10 max?) of driver (custid)."""
-        r = await self.__req(URL_LASTRACE_STATS % (custid),
-                             cookie=self.last_cookie)
-        lastrace_dict = parse(r)
-
-        if lastrace_dict == '' and retry:
-            self.log.info('attempting to log in and try again')
-            self.logged = False
-            await self.login()
-            return await self.lastrace_stats(custid, False)
-        elif not lastrace_dict:
+        lastrace_dict = await self.__req_json(URL_LASTRACE_STATS % (custid),
+                                              retry=retry)
+        if not lastrace_dict:
             return []
 
-        return map(lambda x: LastRacesStats(x), lastrace_dict)
+        return LastRacesStats.from_list(lastrace_dict)
 
     @logged_in
     async def driver_search(self, race_type=RACE_TYPE_ROAD, location=LOC_ALL,
@@ -329,21 +515,17 @@ class iRWebStats:
                 'lowerbound': lowerbound, 'upperbound': upperbound,
                 'sort': sort, 'order': order, 'active': active}
 
-        total_results, drivers = 0, {}
+        total_results, drivers = 0, ResultSet([], {})
 
         try:
-            r = await self.__req(URL_DRIVER_STATS, data=data,
-                                 cookie=self.last_cookie)
-            res = parse(r)
-            total_results = res['d'][list(res['m'].keys())[list(res['m'].values()).index('rowcount')]]
-            custid_id = list(res['m'].keys())[list(res['m'].values()).index('rowcount')]
+            res = await self.__req_json(URL_DRIVER_STATS, data=data)
             header = res['m']
-            f = res['d']['r'][0]
-            if int(f[custid_id]) == int(self.custid):
-                drivers = res['d']['r'][1:]
-            else:
-                drivers = res['d']['r']
-            drivers = format_results(drivers, header)
+            total_results = res['d'][find_key(header, 'rowcount')]
+            drivers = ResultSet(res['d']['r'], header)
+            # The logged in driver is sent first in every page, skip it
+            if drivers and drivers[0].get('custid') is not None \
+                    and int(drivers[0]['custid']) == int(self.custid):
+                drivers = drivers[1:]
 
         except Exception as e:
             self.log.info("Error fetching driver search data. Error: " + str(e))
@@ -359,11 +541,24 @@ class iRWebStats:
                         license_level=ALL, car=ALL, track=ALL,
                         series=ALL, season=(2016, 3, ALL),
                         date_range=ALL, page=1, sort=SORT_TIME,
-                        order=ORDER_DESC):
+                        order=ORDER_DESC, use_warehouse=True):
         """ Search race results using various fields. Returns a tuple
             (results, total_results) so if you want all results you should
             request different pages (using page). Each page has 25
-            (NUM_ENTRIES) results max."""
+            (NUM_ENTRIES) results max. With a warehouse, searches covered by
+            the pages already fetched are answered from it (planner.py).
+            use_warehouse=False leaves the warehouse out (used by sync,
+            whose store keeps the rows)."""
+
+        filters = {'race_type': race_type, 'event_types': event_types,
+                   'official': official, 'license_level': license_level,
+                   'car': car, 'track': track, 'series': series,
+                   'season': season, 'date_range': date_range}
+        if self.planner is not None and use_warehouse:
+            local = self.planner.answer_results_archive(custid, page, sort,
+                                                        order, **filters)
+            if local is not None:
+                return local
 
         format_ = 'json'
         lowerbound = NUM_ENTRIES * (page - 1) + 1
@@ -389,7 +584,7 @@ class iRWebStats:
         # Official, unofficial
         if official == ALL:
             data['showofficial'] = 1
-            data['showunoofficial'] = 1
+            data['showunofficial'] = 1
         else:
             if EVENT_UNOFFICIAL in official:
                 data['showunofficial'] = 1
@@ -421,18 +616,30 @@ class iRWebStats:
                              LIC_D, LIC_PRO, LIC_PRO_WC)
         for v in license_level:
             data[lic_vars[v]] = 1
-        r = await self.__req(URL_RESULTS_ARCHIVE, data=data,
-                       cookie=self.last_cookie)
-        res = parse(r)
-        total_results = res['d'][list(res['m'].keys())[list(res['m'].values()).index('rowcount')]]
-        results = []
-        if total_results > 0:
-            results = res['d']['r']
-            header = res['m']
-            results = format_results(results, header)
+        res = await self.__req_json(URL_RESULTS_ARCHIVE, data=data)
+        header = res['m']
+        total_results = res['d'][find_key(header, 'rowcount')]
+        results = ResultSet(res['d']['r'] if total_results > 0 else [],
+                            header)
+        if self.warehouse is not None and use_warehouse:
+            context = {'category': race_type}
+            if date_range == ALL:
+                context.update(seasonyear=season[0], seasonquarter=season[1])
+            self.warehouse.store_results_archive(custid, results, **context)
+            self.planner.record_results_archive(custid, page, sort, order,
+                                                total_results, **filters)
 
         return results, total_results
 
+    async def sync_results_archive(self, store, custid=None, **kwargs):
+        """ Adds the results_archive rows of custid missing in store (a
+            sync.ArchiveStore), requesting only what's newer than the last
+            sync. See sync.sync_results_archive. The rows are only saved to
+            store, not to the client's warehouse (which can be the store
+            too). """
+        custid = custid if custid is not None else self.custid
+        return await sync_results_archive(self, store, custid, **kwargs)
+
     @logged_in
     async def all_seasons(self):
         """ Get All season data available at Series Stats page"""
@@ -442,7 +649,7 @@ class iRWebStats:
         if not seasons_dict_list:
             return []
 
-        return list(map(lambda x: Series(x), seasons_dict_list))
+        return Series.from_list(seasons_dict_list)
 
     @logged_in
     async def season_standings(self, season, carclass, club=ALL, raceweek=ALL,
@@ -452,7 +659,16 @@ class iRWebStats:
             and club are ids.  Returns a tuple (results, total_results) so
             if you want all results you should request different pages
             (using page)  until you gather all total_results. Each page has
-            25 results max."""
+            25 results max. Answered from the warehouse when possible, see
+            results_archive."""
+
+        query = {'seasonid': season, 'carclassid': carclass, 'clubid': club,
+                 'raceweek': raceweek, 'division': division}
+        if self.planner is not None:
+            local = self.planner.answer_season_standings(query, page, sort,
+                                                         order)
+            if local is not None:
+                return local
 
         lowerbound = NUM_ENTRIES * (page - 1) + 1
         upperbound = lowerbound + NUM_ENTRIES - 1
@@ -460,12 +676,14 @@ class iRWebStats:
         data = {'sort': sort, 'order': order, 'seasonid': season,
                 'carclassid': carclass, 'clubid': club, 'raceweek': raceweek,
                 'division': division, 'start': lowerbound, 'end': upperbound}
-        r = await self.__req(URL_SEASON_STANDINGS, data=data)
-        res = parse(r)
-        total_results = res['d'][list(res['m'].keys())[list(res['m'].values()).index('rowcount')]]
-        results = res['d']['r']
+        res = await self.__req_json(URL_SEASON_STANDINGS, data=data)
         header = res['m']
-        results = format_results(results, header)
+        total_results = res['d'][find_key(header, 'rowcount')]
+        results = ResultSet(res['d']['r'], header)
+        if self.warehouse is not None:
+            self.warehouse.store_season_standings(query, results)
+            self.planner.record_season_standings(query, page, sort, order,
+                                                 total_results)
 
         return results, total_results
 
@@ -497,20 +715,104 @@ class iRWebStats:
             # multiplied by 1000
             data['starttime_upperbound'] = tc(date_range[1])
 
-        r = await self.__req(URL_HOSTED_RESULTS, data=data)
-        # tofile(r)
-        res = parse(r)
+        res = await self.__req_json(URL_HOSTED_RESULTS, data=data)
         total_results = res['rowcount']
         results = res['rows']  # doesn't need format_results
         return results, total_results
 
+    async def _iter_pages(self, method, concurrency, **kwargs):
+        """ Yields the rows of every page of a paged search method (one
+            returning (results, total_results)). total_results is read from
+            page 1 and up to `concurrency` of the remaining pages are
+            requested at once, still spaced out by the rate limiter. Rows
+            are yielded in page order as the pages arrive. """
+
+        rows, total_results = await method(page=1, **kwargs)
+        for row in rows:
+            yield row
+        pages = -(-int(total_results) // NUM_ENTRIES)
+        pending, next_page = {}, 2
+        try:
+            for page in range(2, pages + 1):
+                while next_page <= pages and len(pending) < concurrency:
+                    pending[next_page] = asyncio.ensure_future(
+                        method(page=next_page, **kwargs))
+                    next_page += 1
+                rows, _ = await pending.pop(page)
+                for row in rows:
+                    yield row
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+    @logged_in(iterator=True)
+    def iter_driver_search(self, concurrency=PAGE_CONCURRENCY, **kwargs):
+        """ Async iterator over all driver_search results. Takes the same
+            search fields as driver_search except page. """
+        return self._iter_pages(self.driver_search, concurrency, **kwargs)
+
+    @logged_in(iterator=True)
+    def iter_results_archive(self, custid=None, concurrency=PAGE_CONCURRENCY,
+                             **kwargs):
+        """ Async iterator over all results_archive results. Takes the same
+            search fields as results_archive except page. """
+        return self._iter_pages(self.results_archive, concurrency,
+                                custid=custid, **kwargs)
+
+    @logged_in(iterator=True)
+    def iter_season_standings(self, season, carclass,
+                              concurrency=PAGE_CONCURRENCY, **kwargs):
+        """ Async iterator over all season_standings results. Takes the same
+            search fields as season_standings except page. """
+        return self._iter_pages(self.season_standings, concurrency,
+                                season=season, carclass=carclass, **kwargs)
+
+    @logged_in(iterator=True)
+    def iter_hosted_results(self, concurrency=PAGE_CONCURRENCY, **kwargs):
+        """ Async iterator over all hosted_results results. Takes the same
+            search fields as hosted_results except page. """
+        return self._iter_pages(self.hosted_results, concurrency, **kwargs)
+
+    async def batch_stats(self, custids, endpoints=BATCH_ENDPOINTS,
+                          concurrency=BATCH_CONCURRENCY):
+        """ Requests the stats in endpoints (names of per driver methods,
+            i.e 'career_stats') for every custid, running up to concurrency
+            requests at once under the rate limiter. Async iterator yielding
+            (custid, endpoint, result) as each one completes. A failed
+            request doesn't stop the batch, its result is the exception. """
+
+        jobs = ((custid, name) for custid in custids
+                for name in endpoints)
+        done = asyncio.Queue(maxsize=concurrency)
+
+        async def worker():
+            for custid, name in jobs:  # Shared by every worker
+                try:
+                    result = await getattr(self, name)(custid)
+                except Exception as e:
+                    result = e
+                await done.put((custid, name, result))
+            await done.put(None)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            running = len(workers)
+            while running:
+                item = await done.get()
+                if item is None:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            for w in workers:
+                w.cancel()
+
     @logged_in
     async def session_times(self, series_season, start, end):
         """ Gets Current and future sessions (qualy, practice, race)
             of series_season """
-        r = await self.__req(URL_SESSION_TIMES, data={'start': start, 'end': end,
-                                                'season': series_season}, useget=True)
-        return parse(r)
+        return await self.__req_json(URL_SESSION_TIMES, data={
+            'start': start, 'end': end, 'season': series_season}, useget=True)
 
     @logged_in
     async def current_series_images(self):
@@ -532,39 +834,118 @@ class iRWebStats:
     async def season_race_sessions(self, season, raceweek):
         """ Gets races sessions for season in specified raceweek """
 
-        r = await self.__req(URL_SERIES_RACERESULTS, data={'seasonid': season,
-                                                     'raceweek': raceweek})  # TODO no bounds?
-        res = parse(r)
+        res = await self.__req_json(URL_SERIES_RACERESULTS, data={
+            'seasonid': season, 'raceweek': raceweek})  # TODO no bounds?
         try:
-            header = res['m']
-            results = res['d']
-            results = format_results(results, header)
-            return results
+            return ResultSet(res['d'], res['m'])
         except TypeError:
             self.log.info(res)
             return None
 
+    async def __stream_lines(self, url):
+        """ Sends a GET request and yields the lines of the response as they
+            arrive, without keeping the whole body in memory. Like __req, a
+            session found expired (before any line is yielded) is renewed
+            and the request sent again once. """
+
+        await self.__login_done()
+        generation = self._session_generation
+        expired = []
+        async for line in self.__stream_once(url, expired):
+            yield line
+        if expired and await self.__session_expired(url, generation):
+            async for line in self.__stream_once(url, []):
+                yield line
+
+    async def __stream_once(self, url, expired):
+        """ Yields the lines of a GET request to url. When redirected to the
+            login page nothing is yielded and True is added to expired. """
+
+        label = endpoint(url)
+        waited = await self.rate_limiter.acquire()
+        self.metrics.rate_limit_wait.observe(waited, endpoint=label)
+        h = HEADERS.copy()
+        if len(self.last_cookie):
+            h['Cookie'] = self.last_cookie
+        # Latency here includes the time the caller spends on each line
+        start, size, status = time.perf_counter(), 0, 'error'
+        try:
+            async with self.transport.stream('GET', url, headers=h) as resp:
+                status = resp.status_code
+                if at_login_page(resp):
+                    expired.append(True)
+                    return
+                # Split here rather than with aiter_lines() to count the
+                # bytes received, like len(resp.content) does in __send
+                decoder = codecs.getincrementaldecoder(
+                    resp.encoding or 'utf-8')('replace')
+                pending = ''
+                async for chunk in resp.aiter_bytes():
+                    size += len(chunk)
+                    lines = (pending + decoder.decode(chunk)).split('\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield line.rstrip('\r')
+                pending += decoder.decode(b'', True)
+                if pending:
+                    yield pending.rstrip('\r')
+        finally:
+            self.metrics.requests.inc(endpoint=label, method='GET',
+                                      status=status)
+            if status != 'error':
+                self.metrics.latency.observe(time.perf_counter() - start,
+                                             endpoint=label)
+                self.metrics.bytes.observe(size, endpoint=label)
+
+    async def _event_rows(self, subsession, sessnum, meta):
+        """ Yields the result rows (tuples) of an event results CSV as it
+            streams in. Values are converted with a type plan built once
+            from the header (see util.type_plan). meta gets the event info
+            ('info') and the result column names ('header'). """
+
+        meta.setdefault('info', {})
+        meta.setdefault('header', [])
+        reader, plan, header_ev = CSVRecords(), None, []
+        n = 0
+        async for line in self.__stream_lines(
+                URL_GET_EVENTRESULTS % (subsession, sessnum)):
+            record = reader.feed(line)
+            if record is None:
+                continue
+            if n == 0:
+                header_ev = record
+            elif n == 1:
+                meta['info'] = dict(zip(header_ev, record))
+            elif n == 3:
+                meta['header'] = [csv_header(h) for h in record]
+                plan = type_plan(meta['header'])
+            elif n > 3:
+                yield tuple([conv(v) for conv, v in zip(plan, record)])
+            n += 1
+
     @logged_in
-    async def event_results(self, subsession, sessnum=0):
+    async def event_results(self, subsession, sessnum=0, columnar=False):
         """ Gets the event results (table of positions, times, etc.). The
-            event is identified by a subsession id. """
-
-        r = await self.__req(URL_GET_EVENTRESULTS % (subsession, sessnum)).encode('utf8').decode('utf-8')
-        data = [x for x in csv.reader(StringIO(r), delimiter=',', quotechar='"')]
-        header_res = []
-        for header in data[3]:
-            header_res.append("".join([c for c in header.lower() if ord(c) > 96 and ord(c) < 123]))
-        header_ev = data[0]
-        for i in range(4, len(data)):
-            for j in range(len(data[i])):
-                if data[i][j] == '':
-                    data[i][j] = None
-                elif data[i][j].isnumeric():
-                    data[i][j] = int(data[i][j])
-        event_info = dict(list(zip(header_ev, data[1])))
-        results = [dict(list(zip(header_res, x))) for x in data[4:]]
-
-        return event_info, results
+            event is identified by a subsession id. Returns a tuple
+            (event_info, results). results is a list of dicts or a
+            ResultSet if columnar is True. """
+
+        meta = {}
+        rows = [row async for row in self._event_rows(subsession, sessnum,
+                                                       meta)]
+        results = ResultSet(rows, meta['header'])
+        if self.warehouse is not None:
+            self.warehouse.store_event_results(subsession, sessnum, results)
+        return meta['info'], results if columnar else results.to_dicts()
+
+    @logged_in
+    async def iter_event_results(self, subsession, sessnum=0):
+        """ Async iterator over the event results rows (dicts), yielded as
+            the CSV is downloaded. """
+
+        meta = {}
+        async for row in self._event_rows(subsession, sessnum, meta):
+            yield dict(zip(meta['header'], row))
 
     @logged_in
     async def event_results2(self, subsession, custid):
@@ -607,9 +988,8 @@ class iRWebStats:
         """ Get the results for a time trial event from the web page.
         """
 
-        r = await self.__req(URL_GET_SUBSESSRESULTS % (subsession), useget=True)
-
-        out = parse(r)['rows']
+        out = (await self.__req_json(URL_GET_SUBSESSRESULTS % (subsession),
+                                     useget=True))['rows']
 
         return out
 
@@ -617,9 +997,8 @@ class iRWebStats:
         """ Get the lap times for an event from the web page.
         """
 
-        r = await self.__req(URL_GET_LAPS_SINGLE % (subsession, custid, sessnum))
-
-        out = parse(r)
+        out = await self.__req_json(
+            URL_GET_LAPS_SINGLE % (subsession, custid, sessnum))
 
         return out
 
@@ -627,26 +1006,46 @@ class iRWebStats:
         """ Get the lap times for an event from the web page.
         """
 
-        r = await self.__req(URL_GET_LAPS_ALL % subsession)
-
-        out = parse(r)
+        out = await self.__req_json(URL_GET_LAPS_ALL % subsession)
+        if self.warehouse is not None and isinstance(out, dict):
+            self.warehouse.store_lap_chart(subsession,
+                                           out.get(LAPCHART_LAPS, []))
 
         return out
 
-    def best_lap(self, subsessionid, custid):
-        """ Get the best lap time for a driver from an event.
+    async def best_lap(self, subsessionid, custid):
+        """ Get the best lap time for a driver from an event, as the site
+            gives it (in 1/10000 s, see LAPCHART_TIME_UNIT).
         """
 
-        laptime = self.event_laps_single(subsessionid, custid)['drivers'][0]['bestlaptime']
+        laps = await self.event_laps_single(subsessionid, custid)
+        laptime = laps['drivers'][0]['bestlaptime']
 
         return laptime
 
+    async def lap_chart(self, subsession):
+        """ event_laps_all as a laps.LapChart, with the lap analysis (best
+            laps, averages, consistency, stints, incidents) of the whole
+            field. Needs numpy. """
+        return LapChart.from_chart(await self.event_laps_all(subsession))
+
+    async def best_lap_times(self, subsessionid, custids=None):
+        """ Best lap of many drivers of an event, computed from a single
+            lap chart request instead of one best_lap per driver. Returns
+            {custid: (lap number, time in seconds)} for custids, or for
+            every driver if None. Unlike best_lap the time is in seconds
+            (best_lap's divided by LAPCHART_TIME_UNIT). """
+        best = (await self.lap_chart(subsessionid)).best_laps()
+        if custids is None:
+            return best
+        return {int(c): best.get(int(c), (None, None)) for c in custids}
+
     async def world_record(self, seasonyear, seasonquarter, carid, trackid, custid):
         """ Get the world record lap time for certain car in a season.
         """
 
-        r = await self.__req(URL_GET_WORLDRECORD % (seasonyear, seasonquarter, carid, trackid, custid))
-        res = parse(r)
+        res = await self.__req_json(URL_GET_WORLDRECORD % (
+            seasonyear, seasonquarter, carid, trackid, custid))
 
         header = res['m']
         try:
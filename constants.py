@@ -2,7 +2,21 @@
 
 ALL = -1
 NUM_ENTRIES = 25  # Entries per page. This is the ammount set in iRacing site. We shouldn't increase it.
+PAGE_CONCURRENCY = 4  # Pages requested at once by the iter_* methods.
+BATCH_CONCURRENCY = 8  # Requests running at once in iRWebStats.batch_stats.
+BATCH_ENDPOINTS = ('career_stats', 'yearly_stats', 'iratingchart', 'lastrace_stats')
 WAIT_TIME = 0.2  # Minimum time in seconds between two consecutive requests to iRacing site.
+RATE_BURST = 1  # Requests that can be sent back to back before WAIT_TIME spacing kicks in.
+POOL_SIZE = 10  # Max open connections kept by the HTTP session.
+POOL_PER_HOST = 10  # Max concurrent requests to a single host.
+POOL_IDLE_TIMEOUT = 30  # Seconds an idle keep-alive connection stays open.
+REQUEST_TIMEOUT = 30  # Seconds before a request to iRacing site is aborted.
+SESSION_TTL = 2 * 3600  # Seconds a saved login session (cookie) is reused for.
+SYNC_SINCE = '2008-01-01'  # First day requested the first time a driver's results archive is synced.
+SYNC_OVERLAP = 6 * 3600  # Seconds before the last synced start_time requested again on the next sync.
+CATALOG_MAX_AGE = 24 * 3600  # Seconds before the iRacing info snapshot (catalog.py) is refreshed.
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds, histogram buckets of metrics.py.
+METRICS_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # Response size buckets of metrics.py.
 
 IRATING_OVAL_CHART = 1
 IRATING_ROAD_CHART = 2
@@ -63,6 +77,11 @@ INC_FLAGS = {
     1024: "clock smash",
     2048: "tow"
 }
+# Lap flags counted as incident laps, and those making a lap time unusable for best laps/consistency (laps.py)
+LAP_INCIDENT_FLAGS = FLAG_OFF_TRACK | FLAG_BLACK_FLAG | FLAG_CAR_RESET | FLAG_CONTACT | FLAG_CAR_CONTACT | \
+                     FLAG_LOST_CONTROL | FLAG_TOW
+LAP_INVALID_FLAGS = FLAG_PITTED | FLAG_CAR_RESET | FLAG_TOW | FLAG_DISCONTINUITY | FLAG_INTERPOLATED_CROSSING | \
+                    FLAG_CLOCK_SMASH
 
 series_short_name_mapping = {
     'iRacing Street Stock Series - R': 'Street Stock - Rookie',
@@ -95,6 +114,8 @@ URL_SESSION_TIMES = 'https://members.iracing.com/membersite/member/GetSessionTim
 URL_SERIES_RACERESULTS = 'https://members.iracing.com/memberstats/member/GetSeriesRaceResults'
 
 URL_GET_EVENTRESULTS = 'https://members.iracing.com/membersite/member/GetEventResultsAsCSV?subsessionid=%s&simsesnum=%s&includeSummary=1'  # simsesnum 0 race, -1 qualy or practice, -2 practice
+URL_GET_EVENTRESULTS2 = 'https://members.iracing.com/membersite/member/EventResult.do?&subsessionid=%s&custid=%s'
+URL_GET_SUBSESSRESULTS = 'https://members.iracing.com/membersite/member/GetSubsessionResults?subsessionID=%s'
 
 URL_GET_LAPS_SINGLE = 'https://members.iracing.com/membersite/member/GetLaps?&subsessionid=%s&groupid=%s&simsessnum=%s'
 URL_GET_LAPS_ALL = 'https://members.iracing.com/membersite/member/GetLapChart?&subsessionid=%s&carclassid=-1'
@@ -104,6 +125,49 @@ URL_GET_PASTSERIES = 'https://members.iracing.com/membersite/member/PreviousSeas
 URL_GET_WORLDRECORD = 'https://members.iracing.com/memberstats/member/GetWorldRecords?seasonyear=%s&seasonquarter=%s' \
                       '&carid=%s&trackid=%s&custid=%s&format=json&upperbound=1 '
 
+# iRacing info (iRWebStats attribute: variable in the home page) loaded on login
+IRSERVICE_LISTINGS = {"TRACKS": "TrackListing", "CARS": "CarListing",
+                      "CARCLASS": "CarClassListing", "CLUBS": "ClubListing",
+                      "SEASON": "SeasonListing", "DIVISION": "DivisionListing",
+                      "YEARANDQUARTER": "YearAndQuarterListing"}
+
+# Column types of the event results CSV (see util.type_plan), by normalized column name
+EVENT_RESULTS_INT = ('finpos', 'carid', 'carclassid', 'teamid', 'custid', 'startpos', 'outid', 'lapsled',
+                     'fastlap', 'lapscomp', 'inc', 'pts', 'clubpts', 'div', 'clubid', 'oldirating', 'newirating',
+                     'oldlicenselevel', 'oldlicensesublevel', 'newlicenselevel', 'newlicensesublevel', 'aggpts')
+EVENT_RESULTS_FLOAT = ('maxfuelfill', 'weightpenaltykg')
+EVENT_RESULTS_LAPTIME = ('interval', 'qualifytime', 'averagelaptime', 'fastestlaptime')
+EVENT_RESULTS_STR = ('car', 'carclass', 'name', 'out', 'club', 'seriesname')  # "Car #" is also read as car
+
+# Lap chart (event_laps_all) response keys
+LAPCHART_LAPS = 'lapdata'  # List of laps (one dict per driver and lap)
+LAPCHART_CUSTID = 'custid'
+LAPCHART_LAP = 'lap'
+LAPCHART_FLAGS = 'flags'
+LAPCHART_TIME = 'ses_time'  # Session time when the lap was completed
+LAPCHART_TIME_UNIT = 10000  # ses_time units per second
+
+# results_archive row columns used to answer queries from the warehouse (planner.py), by filter
+ARCHIVE_COLUMNS = {'series': 'seriesid', 'car': 'carid', 'track': 'trackid', 'event_types': 'evttypeid',
+                   'official': 'officialsession', 'license_level': 'licensegroup', 'raceweek': 'race_week_num',
+                   'start_time': 'start_time'}
+ARCHIVE_EVENT_TYPES = {EVENT_PRACTICE: 2, EVENT_QUALY: 3, EVENT_TTRIAL: 4, EVENT_RACE: 5}  # evttypeid values
+ARCHIVE_OFFICIAL = {EVENT_OFFICIAL: 1, EVENT_UNOFFICIAL: 0}  # officialsession values
+# Seconds stored pages answer queries for, per search (closed date ranges never expire)
+PLANNER_MAX_AGE = {'results_archive': 24 * 3600, 'season_standings': 3600}
+PLANNER_OPEN_MAX_AGE = 0  # Seconds results_archive searches still open when fetched (date range or season not over SYNC_OVERLAP before) answer queries for.
+
+# Seconds a response is kept by the client cache, per endpoint (url without query string)
+CACHE_TTL = {
+    URL_CAREER_STATS.split('?')[0]: 600,
+    URL_YEARLY_STATS.split('?')[0]: 600,
+    URL_CARS_DRIVEN.split('?')[0]: 600,
+    URL_STATS_CHART.split('?')[0]: 300,
+    URL_PERSONAL_BEST.split('?')[0]: 600,
+    URL_SEASON_STANDINGS2: 3600,
+}
+CACHE_SIZE = 1024  # Max responses kept by the client cache
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.17 (KHTML, like Gecko) Chrome/24.0.1312.52 '
                   'Safari/537.17'
@@ -0,0 +1,182 @@
+try:
+    import numpy as np
+except ImportError:  # Optional, only needed by LapChart
+    np = None
+
+from .constants import FLAG_PITTED, LAP_INCIDENT_FLAGS, LAP_INVALID_FLAGS, \
+    LAPCHART_CUSTID, LAPCHART_FLAGS, LAPCHART_LAP, LAPCHART_LAPS, \
+    LAPCHART_TIME, LAPCHART_TIME_UNIT
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("LapChart needs numpy (pip install numpy)")
+
+
+class LapChart:
+    """ Lap chart of a session (event_laps_all) as flat NumPy arrays, one
+        item per driver and lap, sorted by driver and lap: custid, lap,
+        flags (FLAG_* bitmask), session_time and time (lap time), both in
+        seconds. Lap 0 is the start line crossing and has no lap time (nan).
+        The analysis methods work on the whole field at once and return
+        {custid: value}. Laps with any LAP_INVALID_FLAGS (pits, tows,
+        timing glitches) are left out of best laps and consistency. Needs
+        numpy. """
+
+    __slots__ = ('custid', 'lap', 'flags', 'session_time', 'time',
+                 'drivers', 'starts')
+
+    def __init__(self, custid, lap, flags, session_time):
+        _require_numpy()
+        custid = np.asarray(custid, dtype=np.int64)
+        lap = np.asarray(lap, dtype=np.int32)
+        order = np.lexsort((lap, custid))
+        self.custid = custid[order]
+        self.lap = lap[order]
+        self.flags = np.asarray(flags, dtype=np.int32)[order]
+        self.session_time = np.asarray(session_time,
+                                       dtype=np.float64)[order]
+        # Lap time: session time since the previous lap of the same driver
+        self.drivers, self.starts = np.unique(self.custid, return_index=True)
+        self.time = np.full(len(self.custid), np.nan)
+        if len(self.custid):
+            self.time[1:] = np.diff(self.session_time)
+            self.time[self.starts] = np.nan
+            self.time[self.lap <= 0] = np.nan
+
+    @classmethod
+    def from_chart(cls, chart, custid=None):
+        """ Builds the lap chart from an event_laps_all response (or its
+            list of laps). custid is used for laps without one. """
+        _require_numpy()
+        laps = chart.get(LAPCHART_LAPS, []) if isinstance(chart, dict) \
+            else chart or []
+        count = len(laps)
+        custids = np.fromiter((lap.get(LAPCHART_CUSTID, custid)
+                               for lap in laps), np.int64, count)
+        numbers = np.fromiter((lap[LAPCHART_LAP] for lap in laps),
+                              np.int32, count)
+        flags = np.fromiter((lap.get(LAPCHART_FLAGS) or 0 for lap in laps),
+                            np.int32, count)
+        times = np.fromiter((lap[LAPCHART_TIME] for lap in laps),
+                            np.float64, count) / LAPCHART_TIME_UNIT
+        return cls(custids, numbers, flags, times)
+
+    def __len__(self):
+        return len(self.custid)
+
+    def __repr__(self):
+        return 'LapChart(%d laps, %d drivers)' % (len(self), len(self.drivers))
+
+    def driver(self, custid):
+        """ Slice of the arrays holding the laps of custid. """
+        lo, hi = np.searchsorted(self.custid, [custid, custid + 1])
+        return slice(int(lo), int(hi))
+
+    def _per_driver(self, values):
+        return {int(c): (None if np.isnan(v) else float(v))
+                for c, v in zip(self.drivers, values)}
+
+    def _clean_times(self, exclude=LAP_INVALID_FLAGS):
+        """ Lap times with nan for the laps flagged with exclude. """
+        return np.where(self.flags & exclude, np.nan, self.time)
+
+    def _reduce_min(self, values):
+        """ Per driver min of values, ignoring nan (nan if all are). """
+        if not len(values):
+            return values
+        with np.errstate(invalid='ignore'):
+            return np.fmin.reduceat(values, self.starts)
+
+    def best_laps(self, exclude=LAP_INVALID_FLAGS):
+        """ {custid: (lap, time)} of each driver's fastest lap, (None, None)
+            if the driver has no timed lap. """
+        times = self._clean_times(exclude)
+        best = self._reduce_min(times)
+        out = {}
+        for c, start, end, t in zip(self.drivers, self.starts,
+                                    np.append(self.starts[1:], len(self)),
+                                    best):
+            if np.isnan(t):
+                out[int(c)] = (None, None)
+            else:
+                i = start + int(np.nanargmin(times[start:end]))
+                out[int(c)] = (int(self.lap[i]), float(t))
+        return out
+
+    def best_average(self, n, exclude=LAP_INVALID_FLAGS):
+        """ {custid: best average time of n consecutive laps}, None if a
+            driver never ran n consecutive valid laps. """
+        times = self._clean_times(exclude)
+        averages = np.full(len(times), np.nan)
+        if len(times) >= n > 0:
+            invalid = np.isnan(times)
+            sums = np.concatenate(([0.0], np.cumsum(np.where(invalid, 0,
+                                                             times))))
+            bad = np.concatenate(([0], np.cumsum(invalid)))
+            group = np.repeat(np.arange(len(self.starts)),
+                              np.diff(np.append(self.starts, len(self))))
+            # Window ending at lap i spans i - n + 1..i of a single driver
+            end = np.arange(n - 1, len(times))
+            ok = (bad[end + 1] == bad[end + 1 - n]) & \
+                (group[end] == group[end + 1 - n])
+            averages[end[ok]] = (sums[end + 1] - sums[end + 1 - n])[ok] / n
+        return self._per_driver(self._reduce_min(averages))
+
+    def consistency(self, exclude=LAP_INVALID_FLAGS | LAP_INCIDENT_FLAGS):
+        """ {custid: standard deviation of the clean lap times}, None with
+            less than two clean laps. """
+        times = self._clean_times(exclude)
+        if not len(times):
+            return {}
+        valid = ~np.isnan(times)
+        x = np.where(valid, times, 0)
+        count = np.add.reduceat(valid.astype(np.int64), self.starts)
+        total = np.add.reduceat(x, self.starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            # Squares around each driver's mean to keep the precision
+            deviation = np.where(valid, x - np.repeat(
+                mean, np.diff(np.append(self.starts, len(x)))), 0)
+            variance = np.add.reduceat(deviation ** 2, self.starts) / \
+                (count - 1)
+        variance[count < 2] = np.nan
+        return self._per_driver(np.sqrt(variance))
+
+    def incident_laps(self, flags=LAP_INCIDENT_FLAGS):
+        """ {custid: array of the laps with any of flags} """
+        hit = (self.flags & flags) != 0
+        ends = np.append(self.starts[1:], len(self))
+        return {int(c): self.lap[s:e][hit[s:e]]
+                for c, s, e in zip(self.drivers, self.starts, ends)}
+
+    def stints(self):
+        """ {custid: [(first lap, last lap), ...]} of the stints of each
+            driver, split after every pitted lap. """
+        if not len(self):
+            return {}
+        first = np.zeros(len(self), dtype=bool)
+        first[self.starts] = True
+        first[1:] |= (self.flags[:-1] & FLAG_PITTED) != 0
+        begins = np.flatnonzero(first)
+        ends = np.append(begins[1:], len(self)) - 1
+        out = {int(c): [] for c in self.drivers}
+        for b, e in zip(begins, ends):
+            out[int(self.custid[b])].append((int(self.lap[b]),
+                                             int(self.lap[e])))
+        return out
+
+    def summary(self, n=5):
+        """ {custid: dict} with the best lap, best n laps average,
+            consistency, incident laps count and stints of every driver. """
+        best = self.best_laps()
+        average = self.best_average(n)
+        consistency = self.consistency()
+        incidents = self.incident_laps()
+        stints = self.stints()
+        return {c: {'best_lap': best[c][0], 'best_time': best[c][1],
+                    'best_average': average[c],
+                    'consistency': consistency[c],
+                    'incident_laps': len(incidents[c]),
+                    'stints': stints[c]}
+                for c in best}
@@ -0,0 +1,179 @@
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # Optional, only needed by LapStore
+    np = None
+
+from .laps import LapChart
+
+# Store layout: a directory with one raw little endian file per column
+# (laps appended back to back) and index.bin, a header (magic, format
+# version) followed by one record per subsession pointing at its laps.
+MAGIC = b'IRWL'
+VERSION = 1
+HEADER = struct.Struct('<4sH10x')
+COLUMNS = (('subsessionid', '<i8'), ('custid', '<i8'), ('lap', '<i4'),
+           ('time', '<f4'), ('flags', '<i4'), ('carid', '<i4'))
+INDEX = (('subsessionid', '<i8'), ('offset', '<i8'), ('count', '<i8'),
+         ('trackid', '<i4'), ('reserved', '<i4'))
+UNKNOWN = -1  # carid/trackid when not given
+
+
+class LapStore:
+    """ Append-only columnar store of lap charts from many subsessions:
+        subsessionid, custid, lap, time (lap time in seconds, nan for lap
+        0), flags and carid, one array each. Readers map the files with
+        numpy.memmap so columns(), laps() and select() are views or scans
+        over contiguous arrays, with no parsing. A subsession's laps are
+        written once (columns first, then its index record), so readers
+        only see complete subsessions. A single writer is assumed. Needs
+        numpy. """
+
+    def __init__(self, path):
+        if np is None:
+            raise ImportError("LapStore needs numpy (pip install numpy)")
+        self.path = path
+        self.index_path = os.path.join(path, 'index.bin')
+        self._dtypes = {name: np.dtype(t) for name, t in COLUMNS}
+        self._index_dtype = np.dtype(list(INDEX))
+        self._views = None
+        self._index = None
+        self._positions = None
+        os.makedirs(path, exist_ok=True)
+        if not os.path.exists(self.index_path):
+            with open(self.index_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+        with open(self.index_path, 'rb') as f:
+            magic, version = HEADER.unpack(f.read(HEADER.size))
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError("%s isn't a version %d lap store" % (path,
+                                                                  VERSION))
+        self._recover()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + '.col')
+
+    def _map(self, path, dtype, offset=0, count=None):
+        """ Read only memmap of path (empty array for an empty file). """
+        size = (os.path.getsize(path) - offset) // dtype.itemsize \
+            if os.path.exists(path) else 0
+        count = size if count is None else min(count, size)
+        if count <= 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                         shape=(count,))
+
+    def _recover(self):
+        """ Drops a partial index record and the laps written after the
+            last complete one (an append interrupted halfway). """
+        size = HEADER.size + len(self.index) * self._index_dtype.itemsize
+        if os.path.getsize(self.index_path) > size:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(size)
+        end = self.index_end()
+        for name, dtype in self._dtypes.items():
+            path = self._column_path(name)
+            if os.path.exists(path) and \
+                    os.path.getsize(path) > end * dtype.itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(end * dtype.itemsize)
+
+    @property
+    def index(self):
+        """ Structured array of the index records (subsessionid, offset,
+            count, trackid). """
+        if self._index is None:
+            self._index = self._map(self.index_path, self._index_dtype,
+                                    HEADER.size)
+        return self._index
+
+    def index_end(self):
+        index = self.index
+        return int(index['offset'][-1] + index['count'][-1]) \
+            if len(index) else 0
+
+    def refresh(self):
+        """ Maps again the files, to see laps appended since. """
+        self._views = self._index = self._positions = None
+
+    def __len__(self):
+        return self.index_end()
+
+    def __contains__(self, subsessionid):
+        return int(subsessionid) in self._position_map()
+
+    def _position_map(self):
+        if self._positions is None:
+            self._positions = {int(s): i for i, s in
+                               enumerate(self.index['subsessionid'])}
+        return self._positions
+
+    @property
+    def subsessions(self):
+        return self.index['subsessionid']
+
+    def columns(self):
+        """ {column name: memmap view} of every stored lap. """
+        if self._views is None:
+            end = self.index_end()
+            self._views = {name: self._map(self._column_path(name), dtype,
+                                           count=end)
+                           for name, dtype in self._dtypes.items()}
+        return self._views
+
+    def laps(self, subsessionid):
+        """ {column name: view} of the laps of subsessionid (KeyError if it
+            isn't stored). """
+        record = self.index[self._position_map()[int(subsessionid)]]
+        lo = int(record['offset'])
+        hi = lo + int(record['count'])
+        return {name: view[lo:hi] for name, view in self.columns().items()}
+
+    def select(self, custid=None, car=None, track=None, subsessions=None):
+        """ {column name: array} of the laps matching every filter given
+            (custid, carid, trackid or a list of subsessionids), scanning
+            the columns at once. """
+        columns = self.columns()
+        mask = np.ones(len(columns['lap']), dtype=bool)
+        if custid is not None:
+            mask &= columns['custid'] == custid
+        if car is not None:
+            mask &= columns['carid'] == car
+        if track is not None:
+            index = self.index
+            mask &= np.repeat(index['trackid'] == track, index['count'])
+        if subsessions is not None:
+            mask &= np.isin(columns['subsessionid'],
+                            np.asarray(list(subsessions), dtype=np.int64))
+        return {name: view[mask] for name, view in columns.items()}
+
+    def append(self, subsessionid, chart, trackid=UNKNOWN, cars=None):
+        """ Stores the laps of subsessionid. chart is an event_laps_all
+            response or a laps.LapChart, cars an optional {custid: carid}.
+            Returns the number of laps written, 0 if subsessionid was
+            already stored. """
+        if subsessionid in self:
+            return 0
+        if not isinstance(chart, LapChart):
+            chart = LapChart.from_chart(chart)
+        count = len(chart)
+        carids = np.full(count, UNKNOWN, dtype=np.int32)
+        for custid, carid in (cars or {}).items():
+            carids[chart.driver(int(custid))] = carid
+        values = {'subsessionid': np.full(count, subsessionid),
+                  'custid': chart.custid, 'lap': chart.lap,
+                  'time': chart.time, 'flags': chart.flags,
+                  'carid': carids}
+        offset = self.index_end()
+        for name, dtype in self._dtypes.items():
+            with open(self._column_path(name), 'ab') as f:
+                f.write(np.ascontiguousarray(values[name],
+                                             dtype=dtype).tobytes())
+        record = np.array([(subsessionid, offset, count, trackid, 0)],
+                          dtype=self._index_dtype)
+        with open(self.index_path, 'ab') as f:
+            f.write(record.tobytes())
+        self.refresh()
+        return count
@@ -0,0 +1,184 @@
+import bisect
+import math
+from urllib.parse import urlsplit
+
+from .constants import METRICS_BYTES_BUCKETS, METRICS_LATENCY_BUCKETS
+
+
+def endpoint(url):
+    """ Label of a request url: its path, without host nor query. """
+    return urlsplit(url).path or url
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n') \
+        .replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (n, _escape(v)) for n, v in pairs)
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """ A metric family: one value per combination of label values. """
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("%s takes the labels %s" % (
+                self.name, ', '.join(self.labels) or 'none'))
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help.replace(
+            '\\', '\\\\').replace('\n', '\\n')),
+                 '# TYPE %s %s' % (self.name, self.kind)]
+        for suffix, values, extra, value in self._samples():
+            lines.append('%s%s%s %s' % (self.name, suffix, _labels(
+                self.labels, values, extra), _number(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """ Value that only goes up, i.e requests sent. Name it with the
+        _total suffix, HELP, TYPE and the samples all use the name. """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        for values, value in sorted(self._values.items()):
+            yield '', values, (), value
+
+
+class Histogram(Metric):
+    """ Distribution of observed values (i.e latencies) counted in buckets
+        of upper bounds, plus their sum and count. """
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=METRICS_LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts, total = self._values.get(key, (None, 0))
+        if counts is None:
+            counts = [0] * len(self.buckets)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ((), 0))
+        return sum(counts)
+
+    def sum(self, **labels):
+        return self._values.get(self._key(labels), ((), 0))[1]
+
+    def _samples(self):
+        for values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield '_bucket', values, (('le', _number(bound)),), \
+                    cumulative
+            yield '_sum', values, (), total
+            yield '_count', values, (), cumulative
+
+
+class MetricsRegistry:
+    """ The metrics of one or more iRWebStats clients (pass the same
+        registry to share it). render() returns them in the Prometheus text
+        exposition format, to serve on a /metrics page. """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, help, labels, **kwargs)
+        elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+            raise ValueError("%s is already registered as a different "
+                             "metric" % name)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        """ Returns the counter called name, created if missing. """
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(),
+                  buckets=METRICS_LATENCY_BUCKETS):
+        """ Returns the histogram called name, created if missing. """
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def render(self):
+        return ''.join(metric.render() + '\n'
+                       for _, metric in sorted(self.metrics.items()))
+
+
+class ClientMetrics:
+    """ The metrics iRWebStats records per endpoint in registry: requests
+        (by method and status), latency, response bytes, parse time, cache
+        hits and misses, retries and rate limiter waits, and re-logins. """
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None \
+            else MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter(
+            'irwebstats_requests_total', 'Requests sent to iRacing site.',
+            ('endpoint', 'method', 'status'))
+        self.latency = r.histogram(
+            'irwebstats_request_seconds', 'Time until the response was read.',
+            ('endpoint',))
+        self.bytes = r.histogram(
+            'irwebstats_response_bytes', 'Size of the response bodies.',
+            ('endpoint',), buckets=METRICS_BYTES_BUCKETS)
+        self.parse = r.histogram(
+            'irwebstats_parse_seconds', 'Time parsing the JSON responses.',
+            ('endpoint',))
+        self.rate_limit_wait = r.histogram(
+            'irwebstats_rate_limit_wait_seconds',
+            'Time requests waited for the rate limiter.', ('endpoint',))
+        self.cache_hits = r.counter(
+            'irwebstats_cache_hits_total',
+            'Responses served from the cache.', ('endpoint',))
+        self.cache_misses = r.counter(
+            'irwebstats_cache_misses_total',
+            'Cacheable responses not in cache.', ('endpoint',))
+        self.retries = r.counter(
+            'irwebstats_retries_total',
+            'Requests sent again after a re-login.', ('endpoint',))
+        self.relogins = r.counter(
+            'irwebstats_relogins_total',
+            'Logins done after the session expired.')
+
+    def render(self):
+        return self.registry.render()
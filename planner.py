@@ -0,0 +1,288 @@
+import datetime
+import itertools
+import json
+import sqlite3
+import time
+
+from .constants import ALL, ARCHIVE_COLUMNS, ARCHIVE_EVENT_TYPES, \
+    ARCHIVE_OFFICIAL, NUM_ENTRIES, PLANNER_MAX_AGE, PLANNER_OPEN_MAX_AGE, \
+    SORT_TIME, SYNC_OVERLAP
+from .responses.result_set import ResultSet
+from .sync import to_ms
+from .warehouse import column_name
+
+# results_archive filters a stored query can have set to ALL and still
+# cover a query filtering them
+ARCHIVE_FILTERS = ('series', 'event_types', 'official', 'license_level',
+                   'car', 'track')
+
+
+def _normalize(value):
+    """ ALL or a sorted tuple of the selected values. """
+    if value == ALL:
+        return ALL
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(set(value)))
+    return value
+
+
+def _allowed(value, allowed):
+    try:
+        return int(value) in allowed
+    except (TypeError, ValueError):
+        return False
+
+
+def _sort_key(value):
+    try:
+        return 0, float(value), ''
+    except (TypeError, ValueError):
+        return 1, 0, str(value)
+
+
+class QueryPlanner:
+    """ Answers results_archive and season_standings searches from the rows
+        a warehouse.Warehouse already holds. Every page fetched upstream is
+        recorded; once all the pages of a search are stored, that search
+        and any narrower one (i.e same season with a car or track filter,
+        or a date range inside the fetched ones) are filtered, sorted and
+        paged locally, returning the same (results, total_results) as the
+        site. Anything not covered goes upstream and adds to the coverage.
+        Stored pages are trusted for max_age seconds (PLANNER_MAX_AGE),
+        except results_archive date ranges that had ended when fetched,
+        which never expire. results_archive searches still open when
+        fetched (a date range or season not over SYNC_OVERLAP seconds
+        before, so new races may show up) are trusted for open_max_age
+        seconds (PLANNER_OPEN_MAX_AGE, none by default); past that an open
+        date range only covers its part that had ended. """
+
+    def __init__(self, warehouse, max_age=None,
+                 open_max_age=PLANNER_OPEN_MAX_AGE):
+        self.warehouse = warehouse
+        self.max_age = dict(PLANNER_MAX_AGE, **(max_age or {}))
+        self.open_max_age = open_max_age
+        self.hits = self.misses = 0
+        with warehouse.conn:
+            warehouse.conn.execute(
+                'CREATE TABLE IF NOT EXISTS coverage (kind TEXT, key TEXT, '
+                'scope TEXT, lo INTEGER, hi INTEGER, ordering TEXT, '
+                'total INTEGER, pages TEXT, fetched_at REAL, '
+                'PRIMARY KEY (kind, key, scope, lo, hi))')
+
+    # Coverage
+
+    def _record(self, kind, key, scope, lo, hi, ordering, page, total):
+        conn, now = self.warehouse.conn, time.time()
+        row = conn.execute(
+            'SELECT ordering, total, pages, fetched_at FROM coverage WHERE '
+            'kind = ? AND key = ? AND scope = ? AND lo = ? AND hi = ?',
+            (kind, key, scope, lo, hi)).fetchone()
+        pages, fetched_at = [page], now
+        # Pages of another sort, total or expired fetch don't add up
+        if row is not None and (row[0], row[1]) == (ordering, total) and \
+                now - row[3] <= self.max_age[kind]:
+            pages = sorted(set(json.loads(row[2])) | {page})
+            fetched_at = row[3]
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO coverage VALUES '
+                         '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (kind, key, scope, lo, hi, ordering, total,
+                          json.dumps(pages), fetched_at))
+
+    def _complete(self, kind, keys, scopes):
+        """ Returns the (lo, hi) of the complete and fresh coverage entries
+            of kind for any of keys and scopes. """
+        now, found = time.time(), []
+        rows = self.warehouse.conn.execute(
+            'SELECT scope, lo, hi, total, pages, fetched_at FROM coverage '
+            'WHERE kind = ? AND key IN (%s) AND scope IN (%s)' % (
+                ', '.join('?' * len(keys)), ', '.join('?' * len(scopes))),
+            [kind] + list(keys) + list(scopes)).fetchall()
+        for scope, lo, hi, total, pages, fetched_at in rows:
+            needed = set(range(1, max(1, -(-total // NUM_ENTRIES)) + 1))
+            if not needed <= set(json.loads(pages)):
+                continue
+            age = now - fetched_at
+            # Races after ended_at could still show up when it was fetched
+            ended_at = (fetched_at - SYNC_OVERLAP) * 1000
+            if kind != 'results_archive':
+                fresh = age <= self.max_age[kind]
+            elif not hi or hi > ended_at:  # Open range or current season
+                fresh = age <= self.open_max_age
+                if not fresh and scope == 'dates' and lo < ended_at:
+                    found.append((lo, ended_at))
+            else:
+                fresh = scope == 'dates' or age <= self.max_age[kind]
+            if fresh:
+                found.append((lo, hi))
+        return found
+
+    def _page(self, rows, columns, sort, order, page):
+        """ Sorts (nulls last) and pages rows like the site does. """
+        sort = column_name(sort)
+        if sort not in columns:
+            return None
+        i = columns.index(sort)
+        convert = to_ms if sort == column_name(SORT_TIME) else _sort_key
+        valued = [r for r in rows if r[i] is not None]
+        valued.sort(key=lambda r: convert(r[i]),
+                    reverse=str(order).lower() == 'desc')
+        rows = valued + [r for r in rows if r[i] is None]
+        start = NUM_ENTRIES * (page - 1)
+        return ResultSet(rows[start:start + NUM_ENTRIES], columns), len(rows)
+
+    def _select(self, table, where, params):
+        if not self.warehouse._table_columns(table):
+            return None, []
+        try:
+            cur = self.warehouse.conn.execute(
+                'SELECT * FROM "%s" WHERE %s ORDER BY rowid' % (table, where),
+                params)
+        except sqlite3.OperationalError:  # Rows stored without the column
+            return None, []
+        return [d[0] for d in cur.description], cur.fetchall()
+
+    # results_archive
+
+    @staticmethod
+    def _season_end(season):
+        """ ms timestamp a season is over by: the end of its calendar
+            quarter, which seasons run inside. """
+        year, quarter = int(season[0]), int(season[1])
+        end = datetime.date(year + quarter // 4, quarter % 4 * 3 + 1, 1)
+        return to_ms(end.isoformat())
+
+    @classmethod
+    def _archive_scope(cls, season, date_range):
+        """ Returns the scopes a query's season or date range is covered by
+            and its (lo, hi) in ms (hi being the season end for seasons). """
+        if date_range != ALL:
+            return ['dates'], to_ms(date_range[0]), to_ms(date_range[1])
+        scopes = [repr(tuple(season))]
+        if season[2] != ALL:
+            scopes.append(repr((season[0], season[1], ALL)))
+        return scopes, 0, cls._season_end(season)
+
+    @staticmethod
+    def _archive_key(custid, race_type, filters):
+        return repr((int(custid), race_type) + tuple(
+            _normalize(filters[name]) for name in ARCHIVE_FILTERS))
+
+    def record_results_archive(self, custid, page, sort, order, total,
+                               race_type, season, date_range, **filters):
+        """ Records a fetched results_archive page. filters are the rest of
+            the results_archive search fields. """
+        scopes, lo, hi = self._archive_scope(season, date_range)
+        self._record('results_archive',
+                     self._archive_key(custid, race_type, filters),
+                     scopes[0], lo, hi, repr((sort, order)), page,
+                     int(total))
+
+    def answer_results_archive(self, custid, page, sort, order, race_type,
+                               season, date_range, **filters):
+        """ Returns (results, total_results) from the stored rows, or None
+            if the query isn't covered by them. """
+        answer = self._answer_results_archive(
+            custid, page, sort, order, race_type, season, date_range,
+            filters)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def _answer_results_archive(self, custid, page, sort, order, race_type,
+                                season, date_range, filters):
+        scopes, lo, hi = self._archive_scope(season, date_range)
+        # Stored searches with each filter either the same or ALL
+        keys = {self._archive_key(custid, race_type, dict(
+                    zip(ARCHIVE_FILTERS, values)))
+                for values in itertools.product(
+                    *[{_normalize(filters[name]), ALL}
+                      for name in ARCHIVE_FILTERS])}
+        covered = self._complete('results_archive', keys, scopes)
+        if date_range == ALL:
+            if not covered:
+                return None
+        else:  # The stored date ranges must cover lo..hi between them
+            reached = lo
+            for start, end in sorted(covered):
+                if start <= reached:
+                    reached = max(reached, end)
+            if not covered or reached < hi:
+                return None
+
+        columns, rows = self._select('results_archive',
+                                     'custid = ? AND category = ?',
+                                     (int(custid), race_type))
+        if columns is None:
+            return None
+        tests = []  # (column, allowed values or None for a range)
+        for name in ARCHIVE_FILTERS:
+            value = _normalize(filters[name])
+            if value == ALL:
+                continue
+            values = value if isinstance(value, tuple) else (value,)
+            if name == 'event_types':
+                values = [ARCHIVE_EVENT_TYPES[v] for v in values]
+            elif name == 'official':
+                values = [ARCHIVE_OFFICIAL[v] for v in values]
+            tests.append((ARCHIVE_COLUMNS[name], set(values)))
+        if date_range == ALL:
+            tests.append(('seasonyear', {season[0]}))
+            tests.append(('seasonquarter', {season[1]}))
+            if season[2] != ALL:
+                tests.append((ARCHIVE_COLUMNS['raceweek'], {season[2]}))
+        else:
+            tests.append((ARCHIVE_COLUMNS['start_time'], None))
+
+        index = []
+        for column, allowed in tests:
+            column = column_name(column)
+            if column not in columns:  # Can't filter on it, ask the site
+                return None
+            index.append((columns.index(column), allowed))
+        matched = []
+        for row in rows:
+            for i, allowed in index:
+                if allowed is None:
+                    if row[i] is None or not lo <= to_ms(row[i]) <= hi:
+                        break
+                elif not _allowed(row[i], allowed):
+                    break
+            else:
+                matched.append(row)
+        return self._page(matched, columns, sort, order, page)
+
+    # season_standings
+
+    @staticmethod
+    def _standings_key(query):
+        return repr(tuple(query[k] for k in sorted(query)))
+
+    def record_season_standings(self, query, page, sort, order, total):
+        """ Records a fetched season_standings page. query holds the
+            filters, as passed to Warehouse.store_season_standings. """
+        self._record('season_standings', self._standings_key(query), '', 0,
+                     0, repr((sort, order)), page, int(total))
+
+    def answer_season_standings(self, query, page, sort, order):
+        """ Returns (results, total_results) from the stored rows, or None
+            if the query isn't covered by them. """
+        answer = None
+        if self._complete('season_standings', [self._standings_key(query)],
+                          ['']):
+            columns, rows = self._select(
+                'season_standings',
+                ' AND '.join('"%s" = ?' % column_name(k) for k in query),
+                list(query.values()))
+            if columns is not None:
+                answer = self._page(rows, columns, sort, order, page)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
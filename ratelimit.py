@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from .constants import WAIT_TIME, RATE_BURST
+
+
+class RateLimiter:
+    """ Asyncio token bucket used to space out requests to iRacing site.
+        Tokens are refilled at `rate` per second up to `burst`. Callers
+        that find the bucket empty sleep (yielding to the event loop)
+        until their token is available. A single instance can be shared
+        by several iRWebStats clients to enforce a process wide limit. """
+
+    def __init__(self, rate=1 / WAIT_TIME, burst=RATE_BURST):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self.waiting = 0  # Requests currently queued for a token
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def _reserve(self):
+        """ Takes a token and returns how long the caller has to wait for it.
+            The bucket may go negative, which queues callers in FIFO order
+            without needing a lock. """
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    async def acquire(self):
+        """ Waits until a request may be sent. Returns the time waited. """
+        delay = self._reserve()
+        if delay > 0:
+            self.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                self._tokens += 1  # Give the token back if cancelled
+                raise
+            finally:
+                self.waiting -= 1
+        self.acquired += 1
+        self.total_wait += delay
+        self.last_wait = delay
+        self.max_wait = max(self.max_wait, delay)
+        return delay
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def queue_depth(self):
+        return self.waiting
+
+    @property
+    def avg_wait(self):
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+    def stats(self):
+        """ Returns a dict with the limiter counters. """
+        return {'rate': self.rate, 'burst': self.burst,
+                'queue_depth': self.waiting, 'acquired': self.acquired,
+                'total_wait': self.total_wait, 'avg_wait': self.avg_wait,
+                'last_wait': self.last_wait, 'max_wait': self.max_wait}
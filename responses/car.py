@@ -1,4 +1,9 @@
-class Car:
+from .response import Response
+
+
+class Car(Response):
+    __slots__ = ('name', 'id')
+
     def __init__(self, dict):
         self.name = dict['name']
         self.id = dict['id']
@@ -1,7 +1,21 @@
+from .response import Response
 from .car import Car
 
 
-class CarClass:
+class CarClass(Response):
+    __slots__ = ('name', 'cars')
+
     def __init__(self, dict):
         self.name = dict['name']
-        self.cars = list(map(lambda x: Car(x), dict['carclasses']))
+        self.cars = Car.from_list(dict['carclasses'])
+
+    def to_dict(self):
+        d = super().to_dict()
+        d['cars'] = [car.to_dict() for car in self.cars]
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = super().from_dict(d)
+        obj.cars = [Car.from_dict(car) for car in d['cars']]
+        return obj
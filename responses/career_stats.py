@@ -1,4 +1,12 @@
-class CareerStats:
+from .response import Response
+
+
+class CareerStats(Response):
+    __slots__ = ('wins', 'winPerc', 'poles', 'totalclubpoints', 'avgStart',
+                 'avgFinish', 'top5Perc', 'totalLaps', 'avgIncPerRace',
+                 'avgPtsPerRace', 'lapsLed', 'top5', 'lapsLedPerc', 'category',
+                 'starts')
+
     def __init__(self, dict):
         self.wins = dict['wins']
         self.winPerc = round(dict['winPerc'], 2)
@@ -0,0 +1,180 @@
+try:
+    import numpy as np
+except ImportError:  # Optional, only needed by IRatingSeries
+    np = None
+
+from ..sync import to_ms
+
+DAY = 24 * 3600 * 1000  # ms
+WEEK = 7 * DAY
+WEEK_OFFSET = 3 * DAY  # Weeks start on monday (epoch was a thursday)
+PERIODS = {'D': (DAY, 0), 'W': (WEEK, WEEK_OFFSET)}
+MISSING = -1  # iRating of a driver before the first race in stack()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("IRatingSeries needs numpy (pip install numpy)")
+
+
+class IRatingSeries:
+    """ iRating chart (iratingchart) of a driver as two NumPy arrays:
+        timestamps (int64, ms) and values (int32), sorted by time. The
+        analytics (deltas, rolling mean, drawdown, resampling, slicing) run
+        on the whole arrays at once, and IRatingSeries.stack aligns many
+        drivers into a single matrix. Needs numpy. """
+
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self, timestamps, values):
+        _require_numpy()
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int32)
+        if timestamps.shape != values.shape or timestamps.ndim != 1:
+            raise ValueError("timestamps and values must be 1-D arrays of "
+                             "the same length")
+        if len(timestamps) > 1 and (np.diff(timestamps) < 0).any():
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, values = timestamps[order], values[order]
+        self.timestamps = timestamps
+        self.values = values
+
+    @classmethod
+    def from_chart(cls, chart):
+        """ Builds the series from an iratingchart response, a list of
+            [timestamp_ms, irating] pairs. """
+        _require_numpy()
+        points = np.asarray(chart or [], dtype=np.int64).reshape(-1, 2)
+        return cls(points[:, 0], points[:, 1])
+
+    def to_chart(self):
+        """ The series back as a list of [timestamp_ms, irating]. """
+        return np.column_stack((self.timestamps, self.values)).tolist()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        if not len(self):
+            return 'IRatingSeries([])'
+        return 'IRatingSeries(%d points, %d..%d, last %d)' % (
+            len(self), self.timestamps[0], self.timestamps[-1],
+            self.values[-1])
+
+    @property
+    def current(self):
+        """ Last iRating, None if the series is empty. """
+        return int(self.values[-1]) if len(self) else None
+
+    @property
+    def peak(self):
+        return int(self.values.max()) if len(self) else None
+
+    def between(self, start=None, end=None):
+        """ Points from start to end (both included). start and end are
+            timestamps in ms or dates ("%Y-%m-%d"), None for no limit. """
+        lo = 0 if start is None else \
+            np.searchsorted(self.timestamps, to_ms(start), side='left')
+        hi = len(self) if end is None else \
+            np.searchsorted(self.timestamps, to_ms(end), side='right')
+        return IRatingSeries(self.timestamps[lo:hi], self.values[lo:hi])
+
+    def deltas(self):
+        """ iRating change of every race, the difference between each point
+            and the previous one (len(self) - 1 values, aligned with
+            timestamps[1:]). """
+        return np.diff(self.values)
+
+    def rolling_mean(self, window):
+        """ Mean of every window consecutive points (len(self) - window + 1
+            floats, aligned with timestamps[window - 1:]). """
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        if window > len(self):
+            return np.empty(0, dtype=np.float64)
+        sums = np.cumsum(self.values, dtype=np.float64)
+        sums[window:] = sums[window:] - sums[:-window]
+        return sums[window - 1:] / window
+
+    def max_drawdown(self):
+        """ Largest iRating loss from a peak to a later low. Returns a tuple
+            (drawdown, peak timestamp, low timestamp), (0, None, None) if
+            the iRating never dropped. """
+        if not len(self):
+            return 0, None, None
+        peaks = np.maximum.accumulate(self.values)
+        drops = peaks - self.values
+        low = int(np.argmax(drops))
+        if drops[low] == 0:
+            return 0, None, None
+        peak = int(np.argmax(self.values[:low + 1]))
+        return (int(drops[low]), int(self.timestamps[peak]),
+                int(self.timestamps[low]))
+
+    @staticmethod
+    def _period(period):
+        """ (length, offset) in ms of a period 'D', 'W' or seconds. """
+        if period in PERIODS:
+            return PERIODS[period]
+        return int(period * 1000), 0
+
+    def resample(self, period='D', fill=False):
+        """ One point per period ('D' days, 'W' weeks starting on monday,
+            or a number of seconds) holding the last iRating of the period,
+            timestamped at the period start (UTC). With fill, periods
+            without races are included with the previous iRating. """
+        length, offset = self._period(period)
+        if not len(self):
+            return IRatingSeries([], [])
+        buckets = (self.timestamps + offset) // length
+        # Last point of every bucket (timestamps are sorted)
+        last = np.flatnonzero(np.append(np.diff(buckets) != 0, True))
+        starts = buckets[last] * length - offset
+        values = self.values[last]
+        if fill:
+            grid = np.arange(buckets[0], buckets[-1] + 1) * length - offset
+            values = values[np.searchsorted(starts, grid, side='right') - 1]
+            starts = grid
+        return IRatingSeries(starts, values)
+
+    def at(self, timestamps, missing=MISSING):
+        """ iRating at each of timestamps (ms, array): the last point at or
+            before it, missing before the first point. """
+        index = np.searchsorted(self.timestamps,
+                                np.asarray(timestamps, dtype=np.int64),
+                                side='right') - 1
+        if not len(self):
+            return np.full(len(index), missing, dtype=np.int32)
+        out = self.values[np.maximum(index, 0)]
+        out[index < 0] = missing
+        return out
+
+    @classmethod
+    def stack(cls, series, period='D', missing=MISSING):
+        """ Aligns many series into a matrix for leaderboard math. Returns
+            (timestamps, matrix): one column per period start (or per
+            distinct timestamp if period is None) from the first point of
+            any series to the last, one int32 row per series holding its
+            iRating then (missing before its first race). """
+        _require_numpy()
+        series = list(series)
+        if period is None:
+            grid = np.unique(np.concatenate(
+                [s.timestamps for s in series] or [np.empty(0, np.int64)]))
+        else:
+            length, offset = cls._period(period)
+            stamps = [s.timestamps for s in series if len(s)]
+            if not stamps:
+                grid = ends = np.empty(0, dtype=np.int64)
+            else:
+                first = min(s[0] for s in stamps)
+                last = max(s[-1] for s in stamps)
+                grid = np.arange((first + offset) // length,
+                                 (last + offset) // length + 1,
+                                 dtype=np.int64) * length - offset
+                # A period's value is the last one before the next period
+                ends = grid + length - 1
+        matrix = np.empty((len(series), len(grid)), dtype=np.int32)
+        for i, s in enumerate(series):
+            matrix[i] = s.at(grid if period is None else ends, missing)
+        return grid, matrix
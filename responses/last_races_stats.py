@@ -1,4 +1,12 @@
-class LastRacesStats:
+from .response import Response
+
+
+class LastRacesStats(Response):
+    __slots__ = ('startPos', 'lapsLed', 'finishPos', 'incidents', 'trackName',
+                 'sof', 'date', 'seriesID', 'time', 'winnerName', 'winnerID',
+                 'clubPoints', 'champPoints', 'subsessionID', 'seasonID',
+                 'winnerLL')
+
     def __init__(self, dict):
         self.startPos = dict['startPos']
         self.lapsLed = dict['lapsLed']
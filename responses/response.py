@@ -0,0 +1,30 @@
+class Response:
+    """ Base class of the response models. Subclasses declare their
+        attributes in __slots__ (no per instance __dict__) and fill them
+        from a response dict in __init__. """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_list(cls, dicts):
+        """ Builds a model for every dict of a response. Returns a list.
+            Each field is read (and cleaned) in __init__ with constant keys:
+            a per batch plan of slot setters and converters measured slower
+            than that, so the batch only saves the per item Python loop. """
+        return list(map(cls, dicts))
+
+    def to_dict(self):
+        """ Returns the attributes as a dict (see from_dict). """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d):
+        """ Rebuilds a model from to_dict() output, values are taken as they
+            are (no rounding/cleaning is done again). """
+        obj = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(obj, name, d[name])
+        return obj
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
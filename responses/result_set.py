@@ -0,0 +1,87 @@
+from collections.abc import Mapping, Sequence
+
+
+class Row(Mapping):
+    """ Read only dict-like view of one row of a ResultSet. Values are
+        looked up in the raw row through the shared header index, so no
+        per-row dict is built unless to_dict() is called. """
+
+    __slots__ = ('_row', '_rs')
+
+    def __init__(self, row, rs):
+        self._row = row
+        self._rs = rs
+
+    def __getitem__(self, name):
+        try:
+            return self._row[self._rs.index[name]]
+        except IndexError:
+            raise KeyError(name)
+
+    def __iter__(self):
+        header = self._rs.header
+        keys = self._row if isinstance(self._row, dict) \
+            else range(len(self._row))
+        return (header[k] for k in keys)
+
+    def __len__(self):
+        return len(self._row)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return 'Row(%r)' % self.to_dict()
+
+
+class ResultSet(Sequence):
+    """ Compact table of results. rows are kept as received (dicts keyed
+        by the short iRacing keys or plain tuples) and header maps those
+        keys (or tuple positions) to column names. Indexing returns Row
+        views, column(name) returns all the values of a column and
+        to_dicts() converts the whole set to a list of dicts. """
+
+    __slots__ = ('rows', 'header', 'index')
+
+    def __init__(self, rows, header):
+        self.rows = rows
+        if not isinstance(header, dict):  # Column names of tuple rows
+            header = dict(enumerate(header))
+        self.header = header
+        self.index = {name: key for key, name in header.items()}
+
+    @property
+    def columns(self):
+        return list(self.index)
+
+    def column(self, name):
+        key = self.index[name]
+        if self.rows and isinstance(self.rows[0], dict):
+            return [row.get(key) for row in self.rows]
+        return [row[key] for row in self.rows]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            rs = ResultSet.__new__(ResultSet)
+            rs.rows, rs.header, rs.index = self.rows[i], self.header, \
+                self.index
+            return rs
+        return Row(self.rows[i], self)
+
+    def __iter__(self):
+        return (Row(row, self) for row in self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_dicts(self):
+        header = self.header
+        if self.rows and isinstance(self.rows[0], dict):
+            return [{header[k]: v for k, v in row.items()}
+                    for row in self.rows]
+        names = [header[i] for i in range(len(header))]
+        return [dict(zip(names, row)) for row in self.rows]
+
+    def __repr__(self):
+        return 'ResultSet(%d rows, columns=%r)' % (len(self.rows),
+                                                   self.columns)
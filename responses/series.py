@@ -1,13 +1,27 @@
+from .response import Response
 from .car import Car
 from ..constants import series_short_name_mapping
 
 
-class Series:
+class Series(Response):
+    __slots__ = ('seriesId', 'name', 'categoryId', 'cars')
+
     def __init__(self, dict):
         self.seriesId = dict['seriesid']
         self.name = self.short_name(dict['seriesname'])
         self.categoryId = dict['catid']
-        self.cars = list(map(lambda x: Car(x), dict['cars']))
+        self.cars = Car.from_list(dict['cars'])
+
+    def to_dict(self):
+        d = super().to_dict()
+        d['cars'] = [car.to_dict() for car in self.cars]
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = super().from_dict(d)
+        obj.cars = [Car.from_dict(car) for car in d['cars']]
+        return obj
 
     def car_name_list(self):
         return list(map(lambda x: x.name, self.cars))
@@ -1,4 +1,12 @@
-class YearlyStats:
+from .response import Response
+
+
+class YearlyStats(Response):
+    __slots__ = ('wins', 'winPerc', 'year', 'poles', 'clubpoints', 'avgStart',
+                 'avgFinish', 'top5Perc', 'totalLaps', 'avgIncPerRace',
+                 'avgPtsPerRace', 'lapsLed', 'top5', 'lapsLedPerc', 'category',
+                 'starts')
+
     def __init__(self, dict):
         self.wins = dict['wins']
         self.winPerc = round(dict['winPerc'], 2)
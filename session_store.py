@@ -0,0 +1,189 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows, locking is skipped
+    fcntl = None
+
+from .constants import SESSION_TTL
+
+
+class SessionStore:
+    """ Where iRWebStats keeps login sessions (cookie and custid) so they
+        can be reused by later logins and by other processes. Sessions are
+        keyed by username and expire after ttl seconds. lock(key) is held
+        while logging in, so processes (and clients of a process sharing
+        the store) using the same credentials wait for the first login and
+        reuse its session instead of logging in again. lock() isn't
+        re-entrant, save() and delete() may be called while it's held. """
+
+    def load(self, key):
+        """ Returns (cookie, custid) or None if missing or expired. """
+        raise NotImplementedError
+
+    def save(self, key, cookie, custid, ttl=SESSION_TTL):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def lock(self, key):
+        """ Context manager held across a login for key. """
+        return contextlib.nullcontext()
+
+    @staticmethod
+    def _key(key):
+        return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+
+class FileSessionStore(SessionStore):
+    """ Keeps the sessions in a JSON file. Writes are atomic (written aside
+        and renamed) and serialized between processes with a lock file. """
+
+    def __init__(self, path='cookie.tmp'):
+        self.path = path
+        self.lock_path = path + '.lock'
+        # Held by the lock() holder of this process. lock() is entered in an
+        # executor thread and left in the event loop, hence not an RLock.
+        self._mutex = threading.Lock()
+        self._held = False  # The lock file is flock'ed by lock()
+
+    @contextlib.contextmanager
+    def _flock(self):
+        with open(self.lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _writing(self):
+        """ Lock serializing a write with other processes, already held
+            when called inside lock(). """
+        return contextlib.nullcontext() if self._held else self._flock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.session')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(sessions, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def load(self, key):
+        session = self._read().get(self._key(key))
+        if session is None or session['expires_at'] < time.time():
+            return None
+        return session['cookie'], session['custid']
+
+    def save(self, key, cookie, custid, ttl=SESSION_TTL):
+        with self._writing():
+            sessions = self._read()
+            now = time.time()
+            sessions = {k: v for k, v in sessions.items()
+                        if v['expires_at'] >= now}
+            sessions[self._key(key)] = {'cookie': cookie, 'custid': custid,
+                                        'expires_at': now + ttl}
+            self._write(sessions)
+
+    def delete(self, key):
+        with self._writing():
+            sessions = self._read()
+            if sessions.pop(self._key(key), None) is not None:
+                self._write(sessions)
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        with self._mutex, self._flock():
+            self._held = True
+            try:
+                yield
+            finally:
+                self._held = False
+
+
+class SQLiteSessionStore(SessionStore):
+    """ Keeps the sessions in a SQLite database. lock() holds a write
+        transaction, which other processes wait on (up to timeout). """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=timeout,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                           'key TEXT PRIMARY KEY, cookie TEXT, custid TEXT, '
+                           'expires_at REAL)')
+        self._mutex = threading.Lock()  # See FileSessionStore
+
+    def load(self, key):
+        row = self._conn.execute(
+            'SELECT cookie, custid FROM sessions WHERE key = ? '
+            'AND expires_at >= ?', (self._key(key), time.time())).fetchone()
+        return row
+
+    def save(self, key, cookie, custid, ttl=SESSION_TTL):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)',
+            (self._key(key), cookie, str(custid), time.time() + ttl))
+
+    def delete(self, key):
+        self._conn.execute('DELETE FROM sessions WHERE key = ?',
+                           (self._key(key),))
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """ save() and delete() inside it join the transaction. """
+        with self._mutex:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            finally:
+                self._conn.execute('COMMIT')
+
+    def close(self):
+        self._conn.close()
+
+
+class MemorySessionStore(SessionStore):
+    """ Keeps the sessions in memory, for a single process (tests, load
+        runs) where nothing should be written to disk. """
+
+    def __init__(self):
+        self.sessions = {}  # key: (cookie, custid, expires_at)
+        self._mutex = threading.Lock()  # See FileSessionStore
+
+    def load(self, key):
+        session = self.sessions.get(self._key(key))
+        if session is None or session[2] < time.time():
+            return None
+        return session[:2]
+
+    def save(self, key, cookie, custid, ttl=SESSION_TTL):
+        self.sessions[self._key(key)] = (cookie, custid, time.time() + ttl)
+
+    def delete(self, key):
+        self.sessions.pop(self._key(key), None)
+
+    def lock(self, key):
+        return self._mutex
@@ -0,0 +1,92 @@
+import datetime
+import time
+
+from .constants import SYNC_OVERLAP, SYNC_SINCE
+from .util import clean
+
+
+def to_ms(value):
+    """ Converts a start_time value of a results_archive row to a timestamp
+        in ms. Accepts ms, or dates like "2016-09-01 12:00:00". """
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = clean(str(value)).strip()
+    if value.isdigit():
+        return int(value)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(datetime.datetime.strptime(value, fmt)
+                                   .timetuple()) * 1000)
+        except ValueError:
+            pass
+    raise ValueError("Unknown start_time format: %r" % value)
+
+
+def watermark_key(custid, filters):
+    """ Key of the watermark of a custid synced with the given
+        results_archive filters. """
+    return (int(custid),) + tuple(sorted((k, repr(v))
+                                         for k, v in filters.items()))
+
+
+class ArchiveStore:
+    """ In memory store for sync_results_archive. Keeps the synced rows by
+        (custid, subsessionid) and a start_time watermark (ms) per
+        watermark_key. Subclass it (see warehouse.Warehouse) to persist
+        them somewhere else. """
+
+    def __init__(self):
+        self.rows = {}
+        self.watermarks = {}
+
+    def get_watermark(self, key):
+        return self.watermarks.get(key)
+
+    def set_watermark(self, key, value):
+        self.watermarks[key] = value
+
+    def has(self, custid, subsessionid):
+        return (int(custid), int(subsessionid)) in self.rows
+
+    def add(self, custid, rows):
+        """ Stores rows (dicts) of custid. """
+        for row in rows:
+            self.rows[(int(custid), int(row['subsessionid']))] = row
+
+
+async def sync_results_archive(client, store, custid, since=SYNC_SINCE,
+                               overlap=SYNC_OVERLAP, **filters):
+    """ Adds to store the results_archive rows of custid it doesn't have
+        yet. Only the days since the last sync (the watermark, minus
+        overlap seconds for late results) are requested, through the
+        date_range parameter, so a sync usually takes one or two requests.
+        The first sync starts at since ("%Y-%m-%d"). filters are passed to
+        results_archive (race_type, car, track, ...). Returns the new
+        rows. """
+
+    for name in ('date_range', 'season', 'page'):
+        if name in filters:
+            raise ValueError("%s can't be used when syncing" % name)
+    key = watermark_key(custid, filters)
+    watermark = store.get_watermark(key)
+    start = since if watermark is None else \
+        datetime.date.fromtimestamp(watermark / 1000 - overlap).isoformat()
+    end = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+
+    new, seen, latest = [], set(), watermark
+    # The client mustn't save the rows itself: a warehouse as store would
+    # have them before they're checked with store.has()
+    async for row in client.iter_results_archive(
+            custid=custid, date_range=(start, end), use_warehouse=False,
+            **filters):
+        start_time = to_ms(row['start_time'])
+        latest = start_time if latest is None else max(latest, start_time)
+        subsessionid = int(row['subsessionid'])
+        if subsessionid not in seen and not store.has(custid, subsessionid):
+            seen.add(subsessionid)
+            new.append(row.to_dict() if hasattr(row, 'to_dict') else row)
+    if new:
+        store.add(custid, new)
+    if latest is not None and latest != watermark:
+        store.set_watermark(key, latest)
+    return new
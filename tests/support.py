@@ -0,0 +1,122 @@
+""" Fake iRacing site for the tests: a Transport answering the login flow
+    and the routes given, with no network. """
+import asyncio
+import itertools
+import json
+import logging
+
+import httpx
+
+from ..cache import ResponseCache
+from ..client import iRWebStats
+from ..constants import URL_DRIVER_COUNTS, URL_IRACING_LOGIN, \
+    URL_IRACING_LOGIN2
+from ..ratelimit import RateLimiter
+from ..session_store import MemorySessionStore
+from ..transport import Transport
+
+CUSTID = 123
+LOGIN_PAGE = b'<html><form action="/membersite/Login"></form></html>'
+
+
+class FakeSite(Transport):
+    """ routes maps an url (without query string) to a function of the
+        request parameters returning the JSON to answer, or the body as
+        bytes. Requests without the session cookie of the last login are
+        redirected to the login page, like the site does once a session
+        expired. login_delay slows down logins, refuse_logins makes them
+        fail (no session cookie). """
+
+    def __init__(self, routes=None, login_delay=0):
+        self.routes = dict(routes or {})
+        self.routes.setdefault(URL_DRIVER_COUNTS, lambda params: {})
+        self.login_delay = login_delay
+        self.refuse_logins = False
+        self.logins = 0
+        self.requests = []  # (method, url, params)
+        self.session = None
+        self._tokens = itertools.count(1)
+
+    def expire(self):
+        self.session = None
+
+    def _response(self, method, url, content, headers=(), history=()):
+        return httpx.Response(200, content=content, headers=list(headers),
+                              request=httpx.Request(method, url),
+                              history=list(history))
+
+    async def request(self, method, url, headers=None, params=None,
+                      data=None):
+        await asyncio.sleep(0)
+        params = params if params is not None else data
+        self.requests.append((method, url, params))
+        if url == URL_IRACING_LOGIN:
+            return self._response(method, url, LOGIN_PAGE)
+        if url == URL_IRACING_LOGIN2:
+            self.logins += 1
+            await asyncio.sleep(self.login_delay)
+            if self.refuse_logins:
+                return self._response(method, url, LOGIN_PAGE)
+            self.session = 'sso%d' % next(self._tokens)
+            return self._response(
+                method, url, b'<script>var js_custid = %d;</script>' % CUSTID,
+                [('Set-Cookie', 'irsso_members=%s; Path=/' % self.session)])
+        cookie = (headers or {}).get('Cookie', '')
+        if self.session is None or \
+                'irsso_members=%s;' % self.session not in cookie + ';':
+            redirect = httpx.Response(302, request=httpx.Request(method, url))
+            return self._response('GET', URL_IRACING_LOGIN, LOGIN_PAGE,
+                                  history=[redirect])
+        answer = self.routes[url.split('?')[0]](params or {})
+        if isinstance(answer, bytes):
+            return self._response(method, url, answer)
+        return self._response(method, url, json.dumps(answer).encode(),
+                              [('Content-Type', 'application/json')])
+
+
+def make_client(site, session_store=None, **kwargs):
+    """ An iRWebStats on site, with no rate limit nor cache. """
+    log = logging.getLogger('tests')
+    return iRWebStats('user', 'password', log, transport=site,
+                      rate_limiter=RateLimiter(rate=1e9, burst=1e9),
+                      cache=ResponseCache({}),
+                      session_store=session_store or MemorySessionStore(),
+                      **kwargs)
+
+
+ARCHIVE_HEADER = {'1': 'rowcount', '2': 'subsessionid', '3': 'start_time',
+                  '4': 'seriesid', '5': 'carid', '6': 'trackid',
+                  '7': 'evttypeid', '8': 'officialsession'}
+
+
+def archive_row(subsessionid, start, **values):
+    """ A results_archive row (dict of column names) started at start, a
+        datetime. """
+    row = {'subsessionid': subsessionid, 'seriesid': 1, 'carid': 1,
+           'trackid': 1, 'evttypeid': 5, 'officialsession': 1,
+           'start_time': start.strftime('%Y-%m-%d+%H:%M:%S')}
+    row.update(values)
+    return row
+
+
+def archive_route(rows):
+    """ Route answering results_archive searches (date range or season,
+        official or not, custid ignored) from rows, a list that can change
+        between calls. """
+    from ..sync import to_ms
+    keys = {name: key for key, name in ARCHIVE_HEADER.items()}
+    shown = {1: 'showofficial', 0: 'showunofficial'}
+
+    def search(params):
+        matched = [r for r in rows if 'starttime_low' not in params or
+                   params['starttime_low'] <= to_ms(r['start_time']) <=
+                   params['starttime_high']]
+        matched = [r for r in matched
+                   if params.get(shown[r['officialsession']], 1)]
+        matched.sort(key=lambda r: to_ms(r['start_time']), reverse=True)
+        page = matched[params['lowerbound'] - 1:params['upperbound']]
+        return {'m': ARCHIVE_HEADER,
+                'd': {keys['rowcount']: len(matched),
+                      'r': [{keys[k]: v for k, v in r.items()}
+                            for r in page]}}
+    return search
@@ -0,0 +1,48 @@
+import asyncio
+
+from ..catalog import save_catalog
+from ..constants import URL_IRACING_HOME
+from ..session_store import MemorySessionStore
+from .support import FakeSite, make_client
+
+HOME = b"<script>var CarListing = extractJSON('[{\"id\":1}]');</script>"
+
+
+def home_requests(site):
+    return sum(url == URL_IRACING_HOME for _, url, _ in site.requests)
+
+
+def stale_snapshot(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    save_catalog(path, {'CARS': {}}, saved_at=0)
+    return path
+
+
+def test_login_refreshes_stale_snapshot_from_login_page(tmp_path):
+    async def run():
+        site = FakeSite({URL_IRACING_HOME: lambda params: HOME})
+        client = make_client(site, catalog_path=stale_snapshot(tmp_path))
+        assert await client.login()
+        await asyncio.sleep(0.01)
+        return site, client
+    site, client = asyncio.run(run())
+    assert home_requests(site) == 0
+    assert client._catalog_refresh is None
+
+
+def test_close_cancels_background_refresh(tmp_path):
+    async def run():
+        site = FakeSite({URL_IRACING_HOME: lambda params: HOME})
+        store = MemorySessionStore()
+        path = stale_snapshot(tmp_path)
+        assert await make_client(site, store).login()
+        # A saved session: the home page isn't downloaded by the login
+        client = make_client(site, store, catalog_path=path)
+        assert await client.login(get_info=True)
+        refresh = client._catalog_refresh
+        await client.close()
+        await asyncio.sleep(0.01)
+        return site, refresh
+    site, refresh = asyncio.run(run())
+    assert refresh is not None and refresh.cancelled()
+    assert home_requests(site) == 0
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from ..constants import LAPCHART_TIME_UNIT, URL_GET_LAPS_ALL, \
+    URL_GET_LAPS_SINGLE
+from .support import CUSTID, FakeSite, make_client
+
+pytest.importorskip('numpy')
+
+# Session times of the laps of CUSTID: 90s, 85s and 91s laps
+TIMES = [0, 900000, 1750000, 2660000]
+
+
+def lap_chart(params):
+    return {'lapdata': [{'custid': CUSTID, 'lap': lap, 'flags': 0,
+                         'ses_time': t} for lap, t in enumerate(TIMES)],
+            'startgrid': [CUSTID]}
+
+
+def laps_single(params):
+    return {'drivers': [{'custid': CUSTID, 'bestlaptime': 850000,
+                         'bestlapnum': 2}]}
+
+
+def test_best_lap_and_best_lap_times_agree():
+    async def run():
+        site = FakeSite({URL_GET_LAPS_ALL.split('?')[0]: lap_chart,
+                         URL_GET_LAPS_SINGLE.split('?')[0]: laps_single})
+        client = make_client(site)
+        assert await client.login()
+        return (await client.best_lap(1, CUSTID),
+                await client.best_lap_times(1, [CUSTID]))
+    best, times = asyncio.run(run())
+    assert times == {CUSTID: (2, best / LAPCHART_TIME_UNIT)}
@@ -0,0 +1,21 @@
+import asyncio
+
+from ..sync import ArchiveStore
+from .support import FakeSite, make_client
+
+
+def test_logged_out_calls_are_skipped():
+    async def run():
+        client = make_client(FakeSite())
+        iterators = [client.iter_driver_search(),
+                     client.iter_results_archive(),
+                     client.iter_season_standings(1, 2),
+                     client.iter_hosted_results(),
+                     client.iter_event_results(1)]
+        rows = [[row async for row in it] for it in iterators]
+        synced = await client.sync_results_archive(ArchiveStore())
+        return rows, synced, await client.career_stats(1)
+    rows, synced, stats = asyncio.run(run())
+    assert rows == [[]] * 5
+    assert synced == []
+    assert stats is None
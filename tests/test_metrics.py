@@ -0,0 +1,64 @@
+import asyncio
+import re
+
+from ..constants import URL_GET_EVENTRESULTS
+from ..metrics import ClientMetrics, MetricsRegistry, endpoint
+from .support import FakeSite, make_client
+
+
+def test_prometheus_text_format():
+    metrics = ClientMetrics()
+    metrics.requests.inc(endpoint='/a', method='GET', status=200)
+    metrics.requests.inc(endpoint='/a', method='GET', status=200)
+    metrics.latency.observe(0.02, endpoint='/a')
+    metrics.relogins.inc()
+    text = metrics.render()
+
+    assert '# TYPE irwebstats_requests_total counter' in text
+    assert 'irwebstats_requests_total{endpoint="/a",method="GET",' \
+           'status="200"} 2' in text
+    assert 'irwebstats_relogins_total 1' in text
+    assert 'irwebstats_request_seconds_bucket{endpoint="/a",le="0.01"} 0' \
+        in text
+    assert 'irwebstats_request_seconds_bucket{endpoint="/a",le="0.025"} 1' \
+        in text
+    assert 'irwebstats_request_seconds_bucket{endpoint="/a",le="+Inf"} 1' \
+        in text
+    assert 'irwebstats_request_seconds_count{endpoint="/a"} 1' in text
+
+    # Every sample belongs to the family declared by the TYPE above it
+    family = None
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            family, kind = line.split()[2:]
+        elif not line.startswith('#'):
+            name = re.match(r'[a-z_]+', line).group()
+            suffixes = ('_bucket', '_sum', '_count') \
+                if kind == 'histogram' else ()
+            assert name == family or name in [family + s for s in suffixes]
+
+
+def test_registry_shared_and_label_escaping():
+    registry = MetricsRegistry()
+    a, b = ClientMetrics(registry), ClientMetrics(registry)
+    assert a.requests is b.requests
+    a.retries.inc(endpoint='say "hi"\n')
+    assert 'endpoint="say \\"hi\\"\\n"' in registry.render()
+
+
+def test_streamed_response_bytes():
+    csv = ('"Start Time","Track"\r\n"2016-09-01","Nürburgring"\r\n\r\n'
+           '"Fin Pos","Cust ID","Name"\r\n"0","123","Jörg"\r\n').encode()
+
+    async def run():
+        site = FakeSite({URL_GET_EVENTRESULTS.split('?')[0]:
+                         lambda params: csv})
+        client = make_client(site)
+        assert await client.login()
+        info, results = await client.event_results(1)
+        return client, info, results
+    client, info, results = asyncio.run(run())
+    assert info['Track'] == 'Nürburgring'
+    assert results[0]['name'] == 'Jörg'
+    label = endpoint(URL_GET_EVENTRESULTS)
+    assert client.metrics.bytes.sum(endpoint=label) == len(csv)
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+
+import pytest
+
+from ..constants import ALL, EVENT_UNOFFICIAL, URL_RESULTS_ARCHIVE
+from ..warehouse import Warehouse
+from .support import CUSTID, FakeSite, archive_route, archive_row, \
+    make_client
+
+DAY = datetime.timedelta(days=1)
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    warehouse = Warehouse(str(tmp_path / 'w.db'))
+    yield warehouse
+    warehouse.close()
+
+
+def searches(warehouse, rows, *queries, between=None, custid=CUSTID):
+    """ Runs the results_archive queries (kwargs) in order, calling
+        between(rows) after the first one. Returns the (subsessionids,
+        total) of each and the number of searches sent upstream. """
+
+    async def run():
+        site = FakeSite({URL_RESULTS_ARCHIVE: archive_route(rows)})
+        client = make_client(site, warehouse=warehouse)
+        assert await client.login()
+        answers = []
+        for query in queries:
+            results, total = await client.results_archive(custid, **query)
+            answers.append((sorted(r['subsessionid'] for r in results),
+                            total))
+            if between is not None and len(answers) == 1:
+                between(rows)
+        upstream = sum(url == URL_RESULTS_ARCHIVE
+                       for _, url, _ in site.requests)
+        return answers, upstream
+    return asyncio.run(run())
+
+
+def dates(start, end):
+    return {'date_range': (start.strftime('%Y-%m-%d'),
+                           end.strftime('%Y-%m-%d'))}
+
+
+def test_past_season_answered_locally(warehouse):
+    start = datetime.datetime(2016, 7, 1, 12)
+    rows = [archive_row(1000 + i, start + i * DAY, carid=i % 2)
+            for i in range(4)]
+    season = {'season': (2016, 3, ALL)}
+    answers, upstream = searches(warehouse, rows, season, season,
+                                 dict(season, car=1))
+    assert answers == [([1000, 1001, 1002, 1003], 4)] * 2 + \
+        [([1001, 1003], 2)]
+    assert upstream == 1
+
+
+def test_current_season_goes_upstream(warehouse):
+    now = datetime.datetime.now()
+    rows = [archive_row(1000, now - DAY)]
+    season = {'season': (now.year, (now.month - 1) // 3 + 1, ALL)}
+    answers, upstream = searches(
+        warehouse, rows, season, season,
+        between=lambda rows: rows.append(archive_row(1001, now)))
+    assert answers == [([1000], 1), ([1000, 1001], 2)]
+    assert upstream == 2
+
+
+def test_open_date_range_goes_upstream(warehouse):
+    today = datetime.datetime.now()
+    rows = [archive_row(1000, today - 3 * DAY)]
+    query = dates(today - 10 * DAY, today + DAY)
+    answers, upstream = searches(
+        warehouse, rows, query, query,
+        between=lambda rows: rows.append(archive_row(1001, today)))
+    assert answers == [([1000], 1), ([1000, 1001], 2)]
+    assert upstream == 2
+
+
+def test_ended_part_of_open_date_range_answered_locally(warehouse):
+    today = datetime.datetime.now().replace(hour=12)
+    rows = [archive_row(1000 + i, today - (i + 3) * DAY) for i in range(3)]
+    answers, upstream = searches(
+        warehouse, rows, dates(today - 10 * DAY, today + DAY),
+        dates(today - 9 * DAY, today - 3 * DAY))
+    assert answers[1] == ([1001, 1002], 2)
+    assert upstream == 1
+
+
+def test_closed_date_range_answered_locally(warehouse):
+    start = datetime.datetime(2016, 7, 1, 12)
+    rows = [archive_row(1000 + i, start + i * DAY) for i in range(3)]
+    answers, upstream = searches(
+        warehouse, rows, dates(start - DAY, start + 5 * DAY),
+        dates(start, start + 2 * DAY))
+    assert answers[1] == ([1000, 1001], 2)
+    assert upstream == 1
+
+
+def test_unofficial_answered_from_all_sessions(warehouse):
+    start = datetime.datetime(2016, 7, 1, 12)
+    rows = [archive_row(1000, start), archive_row(1001, start + DAY,
+                                                  officialsession=0)]
+    season = {'season': (2016, 3, ALL)}
+    answers, upstream = searches(warehouse, rows, season,
+                                 dict(season, official=(EVENT_UNOFFICIAL,)))
+    assert answers == [([1000, 1001], 2), ([1001], 1)]
+    assert upstream == 1
+
+
+def test_custid_given_as_text(warehouse):
+    start = datetime.datetime(2016, 7, 1, 12)
+    rows = [archive_row(1000 + i, start + i * DAY) for i in range(3)]
+    answers, upstream = searches(warehouse, rows, {'season': (2016, 3, ALL)},
+                                 {'season': (2016, 3, ALL), 'car': 1},
+                                 custid=str(CUSTID))
+    assert answers[1] == ([1000, 1001, 1002], 3)
+    assert upstream == 1
+    assert warehouse.has(str(CUSTID), 1000)
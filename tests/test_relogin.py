@@ -0,0 +1,87 @@
+import asyncio
+
+from ..constants import URL_CARS_DRIVEN, URL_GET_EVENTRESULTS, \
+    URL_SEASON_STANDINGS2
+from .support import FakeSite, make_client
+
+CARS = URL_CARS_DRIVEN.split('?')[0]
+
+
+def site_and_client(**kwargs):
+    site = FakeSite({CARS: lambda params: [1, 2, 3]}, **kwargs)
+    return site, make_client(site)
+
+
+def test_expired_session_logs_in_again_once():
+    async def run():
+        site, client = site_and_client()
+        assert await client.login()
+        site.expire()
+        results = await asyncio.gather(*[client.cars_driven(1)
+                                         for _ in range(5)])
+        return site, client, results
+    site, client, results = asyncio.run(run())
+    assert results == [[1, 2, 3]] * 5
+    assert site.logins == 2
+    assert client.metrics.relogins.value() == 1
+
+
+def test_calls_during_relogin_wait_for_it():
+    async def run():
+        site, client = site_and_client(login_delay=0.1)
+        assert await client.login()
+        site.expire()
+        first = asyncio.ensure_future(client.cars_driven(1))
+        await asyncio.sleep(0.05)  # The re-login is under way
+        assert client.logged
+        second = await client.cars_driven(2)  # Not shared with the first
+        return site, await first, second
+    site, first, second = asyncio.run(run())
+    assert first == second == [1, 2, 3]
+    assert site.logins == 2
+    # The second call waited and was only sent with the new session
+    assert sum(url.startswith(CARS) for _, url, _ in site.requests) == 3
+
+
+def test_failed_relogin_logs_out():
+    async def run():
+        site, client = site_and_client()
+        assert await client.login()
+        site.expire()
+        site.refuse_logins = True
+        return site, client, await client.cars_driven(1)
+    site, client, result = asyncio.run(run())
+    assert not client.logged
+    assert site.logins == 2
+
+
+EVENT_CSV = (b'"Start Time","Track"\r\n"2016-09-01 20:00:00 GMT","Track"\r\n'
+             b'\r\n"Fin Pos","Cust ID","Name"\r\n"0","123","Driver"\r\n')
+SEASONS = (b"<script>var SeasonListing = extractJSON('[{\"seriesid\":1,"
+           b"\"seriesname\":\"Series\",\"catid\":2,\"cars\":[]}]');</script>")
+
+
+def test_expired_session_renewed_for_streamed_csv():
+    async def run():
+        site = FakeSite({URL_GET_EVENTRESULTS.split('?')[0]:
+                         lambda params: EVENT_CSV})
+        client = make_client(site)
+        assert await client.login()
+        site.expire()
+        return site, await client.event_results(1)
+    site, (info, results) = asyncio.run(run())
+    assert info['Start Time'].startswith('2016-09-01')
+    assert [row['custid'] for row in results] == [123]
+    assert site.logins == 2
+
+
+def test_expired_session_renewed_for_html_page():
+    async def run():
+        site = FakeSite({URL_SEASON_STANDINGS2: lambda params: SEASONS})
+        client = make_client(site)
+        assert await client.login()
+        site.expire()
+        return site, await client.all_seasons()
+    site, seasons = asyncio.run(run())
+    assert [s.seriesId for s in seasons] == [1]
+    assert site.logins == 2
@@ -0,0 +1,66 @@
+import asyncio
+
+from ..session_store import FileSessionStore, MemorySessionStore, \
+    SQLiteSessionStore
+from .support import CUSTID, FakeSite, make_client
+
+
+async def login_all(store, clients=4):
+    site = FakeSite(login_delay=0.05)
+    logged = await asyncio.gather(*[make_client(site, store).login()
+                                    for _ in range(clients)])
+    return site, logged
+
+
+def test_file_store_shared_by_clients_logs_in_once(tmp_path):
+    store = FileSessionStore(str(tmp_path / 'cookie.tmp'))
+    site, logged = asyncio.run(login_all(store))
+    assert logged == [True] * 4
+    assert site.logins == 1
+    cookie, custid = store.load('user')
+    assert 'irsso_members' in cookie and custid == CUSTID
+
+
+def test_file_store_instances_log_in_once(tmp_path):
+    path = str(tmp_path / 'cookie.tmp')
+
+    async def run():
+        site = FakeSite(login_delay=0.05)
+        logged = await asyncio.gather(*[
+            make_client(site, FileSessionStore(path)).login()
+            for _ in range(4)])
+        return site, logged
+    site, logged = asyncio.run(run())
+    assert logged == [True] * 4
+    assert site.logins == 1
+
+
+def test_sqlite_store_shared_by_clients_logs_in_once(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    try:
+        site, logged = asyncio.run(login_all(store))
+        assert logged == [True] * 4
+        assert site.logins == 1
+        assert store.load('user')[1] == str(CUSTID)
+    finally:
+        store.close()
+
+
+def test_save_and_delete_outside_lock(tmp_path):
+    store = FileSessionStore(str(tmp_path / 'cookie.tmp'))
+    store.save('user', 'cookie', 1)
+    assert store.load('user') == ('cookie', 1)
+    store.delete('user')
+    assert store.load('user') is None
+
+
+def test_memory_store_shared_by_clients():
+    site, logged = asyncio.run(login_all(MemorySessionStore()))
+    assert logged == [True] * 4
+    assert site.logins == 1
+
+
+def test_memory_store_expiry():
+    store = MemorySessionStore()
+    store.save('user', 'cookie', 1, ttl=-1)
+    assert store.load('user') is None
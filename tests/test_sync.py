@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+
+from ..constants import URL_RESULTS_ARCHIVE
+from ..sync import ArchiveStore
+from ..warehouse import Warehouse
+from .support import CUSTID, FakeSite, archive_route, archive_row, \
+    make_client
+
+
+def upstream_rows(count=3):
+    now = datetime.datetime.now().replace(microsecond=0)
+    return [archive_row(1000 + i, now - datetime.timedelta(days=i + 1))
+            for i in range(count)]
+
+
+def sync_twice(store, warehouse=None):
+    rows = upstream_rows()
+
+    async def run():
+        site = FakeSite({URL_RESULTS_ARCHIVE: archive_route(rows)})
+        client = make_client(site, warehouse=warehouse)
+        assert await client.login()
+        first = await client.sync_results_archive(store, CUSTID)
+        second = await client.sync_results_archive(store, CUSTID)
+        return first, second
+    return asyncio.run(run())
+
+
+def test_sync_into_archive_store():
+    first, second = sync_twice(ArchiveStore())
+    assert sorted(r['subsessionid'] for r in first) == [1000, 1001, 1002]
+    assert second == []
+
+
+def test_sync_into_the_client_warehouse(tmp_path):
+    warehouse = Warehouse(str(tmp_path / 'w.db'))
+    try:
+        first, second = sync_twice(warehouse, warehouse)
+        assert len(first) == 3 and second == []
+        assert all(warehouse.has(CUSTID, 1000 + i) for i in range(3))
+    finally:
+        warehouse.close()
+
+
+def test_sync_into_another_warehouse(tmp_path):
+    store = Warehouse(str(tmp_path / 'store.db'))
+    warehouse = Warehouse(str(tmp_path / 'w.db'))
+    try:
+        first, second = sync_twice(store, warehouse)
+        assert len(first) == 3 and second == []
+    finally:
+        store.close()
+        warehouse.close()
+
+
+def test_sync_sees_new_races_with_a_planner(tmp_path):
+    """ The warehouse's planner mustn't answer the open date range of a
+        sync from the rows of the previous one. """
+    warehouse = Warehouse(str(tmp_path / 'w.db'))
+    rows = upstream_rows()
+
+    async def run():
+        site = FakeSite({URL_RESULTS_ARCHIVE: archive_route(rows)})
+        client = make_client(site, warehouse=warehouse)
+        assert await client.login()
+        first = await client.sync_results_archive(warehouse, CUSTID)
+        rows.append(archive_row(2000, datetime.datetime.now()))
+        second = await client.sync_results_archive(warehouse, CUSTID)
+        return first, second
+    try:
+        first, second = asyncio.run(run())
+        assert len(first) == 3
+        assert [r['subsessionid'] for r in second] == [2000]
+    finally:
+        warehouse.close()
@@ -0,0 +1,28 @@
+import asyncio
+import hashlib
+import json
+from urllib.parse import urlencode
+
+from ..transport import RecordingTransport, ReplayTransport
+from .support import CUSTID, FakeSite, make_client
+
+
+def test_cassette_keys_leave_credentials_out(tmp_path):
+    path = str(tmp_path / 'cassette.json')
+
+    async def run():
+        recorder = RecordingTransport(path, FakeSite())
+        async with recorder:
+            assert await make_client(recorder).login()
+        # Replayed whatever the password, it isn't part of the keys
+        client = make_client(ReplayTransport(path))
+        client.password = 'another'
+        return await client.login(), client.custid
+    assert asyncio.run(run()) == (True, CUSTID)
+
+    with open(path) as f:
+        cassette = f.read()
+    form = {'username': 'user', 'password': 'password'}
+    assert hashlib.sha1(urlencode(form).encode()).hexdigest() not in cassette
+    assert all('password' not in i['request']
+               for i in json.loads(cassette)['interactions'])
@@ -0,0 +1,291 @@
+import asyncio
+import base64
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+
+from .constants import POOL_SIZE, POOL_PER_HOST, POOL_IDLE_TIMEOUT, \
+    REQUEST_TIMEOUT
+
+
+class Transport:
+    """ How iRWebStats sends its requests (pass one as transport=).
+        request() returns an httpx.Response like object (status_code,
+        headers, content, encoding, request, history) and stream() is an
+        async context manager yielding one that can also be read with
+        aiter_lines(). See HTTPTransport, RecordingTransport and
+        ReplayTransport. """
+
+    @property
+    def is_open(self):
+        return True
+
+    async def open(self):
+        return self
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def request(self, method, url, headers=None, params=None,
+                      data=None):
+        raise NotImplementedError
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, headers=None, params=None,
+                     data=None):
+        """ Defaults to the response of request(), read up front. """
+        yield await self.request(method, url, headers=headers,
+                                 params=params, data=data)
+
+
+class HTTPTransport(Transport):
+    """ Long lived pooled HTTP session used by iRWebStats to talk to the
+        iRacing site. Connections are kept alive between requests so TCP and
+        TLS setup is only paid once per pooled connection. pool_size limits
+        the total open connections, per_host the concurrent requests to a
+        single host and idle_timeout how long an unused connection is kept
+        open. host_map ({'https://members.iracing.com':
+        'http://127.0.0.1:8080'}) sends the requests for a site somewhere
+        else, i.e to benchmarks.mock_server. """
+
+    def __init__(self, pool_size=POOL_SIZE, per_host=POOL_PER_HOST,
+                 idle_timeout=POOL_IDLE_TIMEOUT, timeout=REQUEST_TIMEOUT,
+                 host_map=None):
+        self.pool_size = pool_size
+        self.per_host = per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.host_map = dict(host_map or {})
+        self._client = None
+        self._host_slots = {}
+
+    @property
+    def is_open(self):
+        return self._client is not None
+
+    async def open(self):
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size,
+                                  max_keepalive_connections=self.pool_size,
+                                  keepalive_expiry=self.idle_timeout)
+            self._client = httpx.AsyncClient(limits=limits,
+                                             timeout=self.timeout,
+                                             follow_redirects=True)
+        return self
+
+    async def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def _rewrite(self, url):
+        for origin, target in self.host_map.items():
+            if url.startswith(origin):
+                return target + url[len(origin):]
+        return url
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return self._host_slots[host]
+
+    async def request(self, method, url, headers=None, params=None,
+                      data=None):
+        """ Sends a request through the pool and returns the response. The
+            pool is opened on first use if open() wasn't called. """
+        if self._client is None:
+            await self.open()
+        url = self._rewrite(url)
+        async with self._slot(url):
+            return await self._client.request(method, url, headers=headers,
+                                              params=params, data=data)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, headers=None, params=None,
+                     data=None):
+        """ Like request() but the body isn't read up front. Use as
+            `async with transport.stream(...) as resp` and read it with
+            resp.aiter_lines() / resp.aiter_bytes(). """
+        if self._client is None:
+            await self.open()
+        url = self._rewrite(url)
+        async with self._slot(url):
+            async with self._client.stream(method, url, headers=headers,
+                                           params=params, data=data) as resp:
+                yield resp
+
+# Headers describing the body as sent, not the decoded one that's recorded
+DECODED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+# Form fields left out of the cassette keys (sent by login requests)
+CREDENTIAL_FIELDS = ('username', 'password')
+
+
+def _url(url, params):
+    return str(httpx.URL(url, params=params)) if params else url
+
+
+def _body(data):
+    """ The form data as keyed, without the CREDENTIAL_FIELDS. """
+    if data is None:
+        return b''
+    if isinstance(data, dict):
+        data = urlencode({k: v for k, v in data.items()
+                          if k not in CREDENTIAL_FIELDS})
+    return data.encode('utf8') if isinstance(data, str) else bytes(data)
+
+
+def _key(method, url, body):
+    """ Cassette key of a request. The body is only kept as a digest, and
+        the login form fields (CREDENTIAL_FIELDS) are left out of it, so
+        they can't be recovered from the cassette by guessing them. """
+    return '%s %s %s' % (method.upper(), url,
+                         hashlib.sha1(body).hexdigest() if body else '-')
+
+
+class RecordingTransport(Transport):
+    """ Sends the requests through transport (an HTTPTransport by default)
+        and records each one in the cassette at path: the request (method,
+        url, digest of the body) and its response (status, headers, body,
+        redirects followed) with the seconds it took. The cassette is
+        written on close() or save(), adding to the one already there.
+        Response headers are kept as is, so cassettes hold session cookies
+        and should be handled like them. """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self._owns_transport = transport is None
+        self.transport = transport or HTTPTransport()
+        self.interactions = []
+        self._saved = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                self._recorded = json.load(f)['interactions']
+        else:
+            self._recorded = []
+
+    @property
+    def is_open(self):
+        return self.transport.is_open
+
+    async def open(self):
+        await self.transport.open()
+        return self
+
+    async def close(self):
+        self.save()
+        if self._owns_transport:
+            await self.transport.close()
+
+    def save(self):
+        """ Writes the cassette (atomically) if there's anything new. """
+        if self._saved == len(self.interactions):
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': 1,
+                       'interactions': self._recorded + self.interactions},
+                      f, indent=1)
+        os.replace(tmp, self.path)
+        self._saved = len(self.interactions)
+
+    def _record(self, method, url, params, data, resp, elapsed):
+        content = resp.content
+        try:
+            body = {'text': content.decode('utf8')}
+        except UnicodeDecodeError:
+            body = {'base64': base64.b64encode(content).decode('ascii')}
+        self.interactions.append({
+            'request': _key(method, _url(url, params), _body(data)),
+            'status': resp.status_code,
+            'headers': [(k, v) for k, v in resp.headers.multi_items()
+                        if k.lower() not in DECODED_HEADERS],
+            'body': body,
+            'url': str(resp.url),
+            # Sent by the last request (redirects add the session cookie)
+            'cookie': resp.request.headers.get('cookie'),
+            'history': [[r.status_code, str(r.url)] for r in resp.history],
+            'elapsed': elapsed})
+
+    async def request(self, method, url, headers=None, params=None,
+                      data=None):
+        start = time.perf_counter()
+        resp = await self.transport.request(method, url, headers=headers,
+                                            params=params, data=data)
+        self._record(method, url, params, data, resp,
+                     time.perf_counter() - start)
+        return resp
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, headers=None, params=None,
+                     data=None):
+        """ The body is read in full to be recorded, then yielded. """
+        start = time.perf_counter()
+        async with self.transport.stream(method, url, headers=headers,
+                                         params=params, data=data) as resp:
+            await resp.aread()
+            self._record(method, url, params, data, resp,
+                         time.perf_counter() - start)
+            yield resp
+
+
+class ReplayTransport(Transport):
+    """ Answers the requests from a RecordingTransport cassette, with no
+        network. Equal requests recorded several times are answered in the
+        recorded order, the last response being repeated once they run
+        out. A request missing from the cassette raises KeyError. Each
+        response is delayed by its recorded duration times latency (0, the
+        default, answers at once; 1 replays the recorded latencies). """
+
+    def __init__(self, path, latency=0):
+        self.path = path
+        self.latency = latency
+        self.responses = collections.defaultdict(collections.deque)
+        with open(path) as f:
+            for interaction in json.load(f)['interactions']:
+                self.responses[interaction['request']].append(interaction)
+        self.replayed = 0
+        self.missed = 0
+
+    def _response(self, interaction, method, url, headers):
+        body = interaction['body']
+        content = body['text'].encode('utf8') if 'text' in body \
+            else base64.b64decode(body['base64'])
+        history = [httpx.Response(status, request=httpx.Request(method, u))
+                   for status, u in interaction['history']]
+        headers = dict(headers or {})
+        if interaction['cookie'] is not None:
+            headers['Cookie'] = interaction['cookie']
+        return httpx.Response(
+            interaction['status'], headers=interaction['headers'],
+            content=content, history=history, request=httpx.Request(
+                method, interaction['url'], headers=headers))
+
+    async def request(self, method, url, headers=None, params=None,
+                      data=None):
+        url = _url(url, params)
+        recorded = self.responses.get(_key(method, url, _body(data)))
+        if not recorded:
+            self.missed += 1
+            raise KeyError("No recorded response for %s %s" % (method, url))
+        interaction = recorded.popleft() if len(recorded) > 1 \
+            else recorded[0]
+        if self.latency:
+            await asyncio.sleep(interaction['elapsed'] * self.latency)
+        self.replayed += 1
+        return self._response(interaction, method, url, headers)
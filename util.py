@@ -1,12 +1,17 @@
+import csv
+import functools
 import inspect
 import json
+import re
 
-from .decorator import decorator
+from .constants import EVENT_RESULTS_INT, EVENT_RESULTS_FLOAT, \
+    EVENT_RESULTS_LAPTIME, EVENT_RESULTS_STR, URL_IRACING_LOGIN
 
 try:
-    from urllib.parse import unquote  # python3
+    from urllib.parse import unquote, urlsplit  # python3
 except:
     from urllib import unquote  # python2
+    from urlparse import urlsplit
 
 
 def tofile(data):
@@ -25,22 +30,73 @@ def format_results(results, header):
     return newres
 
 
-def __logged_in(func, *args, **kw):
-    args2 = list(args)
-    irweb = args2[0]
-    if not irweb.logged:
-        pprint("Error, client is not logged in to iRacing Platform so\
-                operation couldn't be completed.", irweb.verbose)
-        return None
+def find_key(header, name):
+    """ Returns the short key used in a response for the column name
+        (i.e find_key(res['m'], 'rowcount')). """
+    for k, v in header.items():
+        if v == name:
+            return k
+    raise KeyError(name)
+
+
+async def _skipped():
+    return None
+
+
+async def _no_rows():
+    return
+    yield
+
+
+def _not_logged_in(irweb, func, skipped):
+    irweb.log.warning("Error, client is not logged in to iRacing Platform so "
+                      "%s couldn't be completed.", func.__name__)
+    return skipped() if skipped is not None else None
+
 
-    if 'custid' in inspect.getfullargspec(func).args:
-        args2[1] = args2[1] if args2[1] is not None else irweb.custid
+def _with_custid(irweb, index, args, kw):
+    """ Replaces a missing or None custid (at args[index]) by the client's
+        custid. """
+    if len(args) > index:
+        args = args[:index] + (irweb.custid,) + args[index + 1:]
+    elif kw.get('custid') is None:
+        kw['custid'] = irweb.custid
+    return args
 
-    return func(*args2, **kw)
 
+def logged_in(func=None, iterator=False):
+    """ Decorator of the iRWebStats methods that need a logged in client.
+        When not logged in the call is skipped: None is returned (awaited
+        for coroutines) or, for async generators and methods returning an
+        async iterator (decorated with @logged_in(iterator=True)), an empty
+        async iterator. A custid argument left as None is replaced by the
+        client's custid. Where custid is in the arguments is found once,
+        here, and the wrapper returns func's coroutine (or async generator)
+        itself instead of adding another, so a call only adds a couple of
+        checks. """
 
-def logged_in(func):
-    return decorator(__logged_in, func)
+    if func is None:
+        return functools.partial(logged_in, iterator=iterator)
+    params = list(inspect.signature(func).parameters)
+    # Index in the arguments after self, -1 if func has no custid
+    index = params.index('custid') - 1 if 'custid' in params else -1
+    coroutine = inspect.iscoroutinefunction(func)
+    if iterator or inspect.isasyncgenfunction(func):
+        skipped = _no_rows
+    else:
+        skipped = _skipped if coroutine else None
+
+    @functools.wraps(func)
+    def wrapper(irweb, *args, **kw):
+        if not irweb.logged:
+            return _not_logged_in(irweb, func, skipped)
+        if index >= 0 and (len(args) <= index or args[index] is None):
+            args = _with_custid(irweb, index, args, kw)
+        return func(irweb, *args, **kw)
+
+    if coroutine and hasattr(inspect, 'markcoroutinefunction'):  # 3.12+
+        inspect.markcoroutinefunction(wrapper)
+    return wrapper
 
 
 def pprint(string, v=True):
@@ -48,14 +104,179 @@ def pprint(string, v=True):
         print(' '.join(str(string).split()))
 
 
+class NotJSON:
+    """ Type of NOT_JSON, returned by parse() when a response isn't JSON.
+        That's usually the login page sent back when the session expired.
+        It's falsy so `if not parse(r)` checks keep working. """
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'NOT_JSON'
+
+
+NOT_JSON = NotJSON()
+
+
+def set_json_backend(loads=None):
+    """ Sets the function used by parse() to decode JSON. It gets the raw
+        response (bytes or str). With no argument the fastest installed
+        library is used (orjson, then ujson, then the json module). """
+    global _json_loads
+    if loads is None:
+        loads = json.loads
+        for name in ('orjson', 'ujson'):
+            try:
+                loads = __import__(name).loads
+                break
+            except ImportError:
+                pass
+    _json_loads = loads
+
+
+set_json_backend()
+
+
+class Content:
+    """ Raw response body (data) plus the charset it was sent with, so it
+        can be parsed as bytes or decoded to text later (see decode).
+        expired is True when it's the login page the site redirected the
+        request to because the session expired (see at_login_page). """
+
+    __slots__ = ('data', 'encoding', 'expired')
+
+    def __init__(self, data, encoding=None, expired=False):
+        self.data = data
+        self.encoding = encoding
+        self.expired = expired
+
+    def __len__(self):
+        return len(self.data)
+
+
+def at_login_page(resp):
+    """ Whether resp (an httpx.Response) ended on the login page, where the
+        site redirects the requests sent once the session expired. """
+    return urlsplit(str(resp.url)).path == urlsplit(URL_IRACING_LOGIN).path
+
+
+def decode(content):
+    return content.data.decode(content.encoding or 'utf-8', 'replace')
+
+
 def parse(data):
-    res = ''
+    """ Decodes a JSON response (iRacing responses are generally in JSON).
+        data can be the raw response Content (see iRWebStats.__req binary),
+        which avoids decoding it to str first.
+        Returns NOT_JSON if data isn't valid JSON. """
+    if isinstance(data, Content):
+        encoding = (data.encoding or 'utf-8').lower().replace('-', '')
+        # Fast decoders only take UTF-8 bytes
+        data = data.data if encoding in ('utf8', 'ascii') else decode(data)
     try:
-        res = json.loads(data)  # iRacing responses are generally in JSON
-    except:
-        pass  # TODO raise error?
+        return _json_loads(data)
+    except (ValueError, TypeError):  # Decode errors subclass ValueError
+        return NOT_JSON
+
+
+JS_LISTING = re.compile(r"var (\w+) = extractJSON\('(.*?)'\);", re.S)
+
+
+def extract_listings(resp, names=None):
+    """ Finds every `var X = extractJSON('...');` block of a page in a
+        single pass. Returns {X: [raw, ...]} (raw JSON strings in page
+        order) for the variables in names, or for all of them if names is
+        None. Use decode_listing to decode them. """
+    names = None if names is None else set(names)
+    found = {}
+    for m in JS_LISTING.finditer(resp):
+        name = m.group(1)
+        if names is None or name in names:
+            found.setdefault(name, []).append(m.group(2))
+    return found
+
+
+def decode_listing(raw):
+    return _json_loads(raw.replace('+', ' '))
+
+
+def csv_header(name):
+    """ Normalizes an event results CSV column name ("Fin Pos" -> "finpos") """
+    return "".join([c for c in name.lower() if 96 < ord(c) < 123])
+
+
+def to_int(v):
+    if v == '':
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        return v
+
+
+def to_float(v):
+    if v == '':
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        return v
+
+
+def to_laptime(v):
+    """ Converts a lap time ("1:23.456" or "23.456") to seconds """
+    if v == '':
+        return None
+    try:
+        minutes, _, seconds = v.rpartition(':')
+        return int(minutes or 0) * 60 + float(seconds)
+    except ValueError:
+        return v  # i.e "-1L" intervals
+
+
+def to_str(v):
+    return v if v != '' else None
+
+
+def to_auto(v):
+    if v == '':
+        return None
+    return int(v) if v.isnumeric() else v
+
+
+EVENT_RESULTS_TYPES = {}
+for _names, _conv in ((EVENT_RESULTS_INT, to_int),
+                      (EVENT_RESULTS_FLOAT, to_float),
+                      (EVENT_RESULTS_LAPTIME, to_laptime),
+                      (EVENT_RESULTS_STR, to_str)):
+    EVENT_RESULTS_TYPES.update(dict.fromkeys(_names, _conv))
+
+
+def type_plan(header, types=None):
+    """ Returns the converter of each column of an event results CSV given
+        its (normalized) header. Columns missing in types (defaults to
+        EVENT_RESULTS_TYPES) are converted to int when numeric. """
+    types = EVENT_RESULTS_TYPES if types is None else types
+    return [types.get(name, to_auto) for name in header]
+
+
+class CSVRecords:
+    """ Incremental CSV reader. feed() it lines (without line endings) as
+        they arrive and it returns each complete record, or None while a
+        quoted field that spans more than one line is still open. """
+
+    def __init__(self):
+        self._pending = None
 
-    return res
+    def feed(self, line):
+        if self._pending is not None:
+            line = self._pending + '\n' + line
+        if line.count('"') % 2:  # Quoted field continues in the next line
+            self._pending = line
+            return None
+        self._pending = None
+        return next(csv.reader([line]), [])
 
 
 def clean(string):
@@ -0,0 +1,167 @@
+import json
+import re
+import sqlite3
+
+from .constants import LAPCHART_CUSTID, LAPCHART_LAP
+from .sync import ArchiveStore
+
+# Columns indexed in every table that has them
+INDEXED_COLUMNS = ('subsessionid', 'custid', 'seasonid', 'carid', 'trackid')
+
+
+def column_name(name):
+    """ Sanitizes a response column name to be used in SQL. """
+    name = re.sub(r'[^0-9a-zA-Z_]', '_', str(name)).lower()
+    return name if name and not name[0].isdigit() else '_' + name
+
+
+def sql_value(value):
+    if isinstance(value, (list, dict, tuple)):
+        return json.dumps(value)
+    return value
+
+
+class Warehouse(ArchiveStore):
+    """ Optional SQLite store of the data fetched by iRWebStats (pass it as
+        warehouse= to the client). Each kind of response gets its own table,
+        created with the columns found in the response headers (res['m'])
+        and extended when new ones show up. Rows are written in bulk with
+        executemany, updating rows with the same key, and the key columns
+        (subsession, custid, season, car, track) are indexed. It can also
+        be used as the store of sync.sync_results_archive. """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS watermarks '
+                          '(key TEXT PRIMARY KEY, value INTEGER)')
+        self._columns = {}
+
+    def close(self):
+        self.conn.close()
+
+    def _table_columns(self, table):
+        if table not in self._columns:
+            cur = self.conn.execute('PRAGMA table_info("%s")' % table)
+            self._columns[table] = [r[1] for r in cur.fetchall()]
+        return self._columns[table]
+
+    def _ensure_table(self, table, columns, key):
+        existing = self._table_columns(table)
+        if not existing:
+            self.conn.execute('CREATE TABLE "%s" (%s)' % (
+                table, ', '.join('"%s"' % c for c in columns)))
+            self.conn.execute('CREATE UNIQUE INDEX "%s_key" ON "%s" (%s)' % (
+                table, table, ', '.join('"%s"' % c for c in key)))
+            for c in INDEXED_COLUMNS:
+                if c in columns and c != key[0]:
+                    self.conn.execute(
+                        'CREATE INDEX "%s_%s" ON "%s" ("%s")' % (
+                            table, c, table, c))
+            existing.extend(columns)
+            return
+        for c in columns:
+            if c not in existing:
+                self.conn.execute('ALTER TABLE "%s" ADD COLUMN "%s"'
+                                  % (table, c))
+                existing.append(c)
+
+    def store(self, table, rows, key, context=None):
+        """ Writes rows (a ResultSet or a list of dicts) to table. context
+            holds values added to every row (i.e the query parameters).
+            key lists the columns identifying a row. Returns the number of
+            rows written. """
+        context = {column_name(k): v for k, v in (context or {}).items()}
+        if hasattr(rows, 'to_dicts'):
+            rows = rows.to_dicts()
+        if not rows:
+            return 0
+        names = {}  # Response column name -> SQL column name
+        for row in rows:
+            for name in row:
+                if name not in names:
+                    names[name] = column_name(name)
+        columns = list(context)
+        for c in list(names.values()) + [column_name(k) for k in key]:
+            if c not in columns:
+                columns.append(c)
+        values = []
+        for row in rows:
+            d = {names[k]: sql_value(v) for k, v in row.items()}
+            d.update(context)
+            values.append(tuple([d.get(c) for c in columns]))
+        key = [column_name(k) for k in key]
+        # Existing rows are updated, keeping the values the new row lacks
+        # (i.e season columns of a row fetched again by date range)
+        update = ', '.join('"%s" = COALESCE(excluded."%s", "%s")' % (c, c, c)
+                           for c in columns if c not in key)
+        with self.conn:
+            self._ensure_table(table, columns, key)
+            self.conn.executemany(
+                'INSERT INTO "%s" (%s) VALUES (%s) ON CONFLICT (%s) DO %s' % (
+                    table, ', '.join('"%s"' % c for c in columns),
+                    ', '.join('?' * len(columns)),
+                    ', '.join('"%s"' % c for c in key),
+                    'UPDATE SET ' + update if update else 'NOTHING'),
+                values)
+        return len(values)
+
+    def query(self, sql, params=()):
+        """ Runs a query and returns the rows as dicts. """
+        cur = self.conn.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    # Responses
+
+    def store_results_archive(self, custid, results, **context):
+        """ context holds extra query values kept with the rows (category,
+            seasonyear, seasonquarter), used by planner.QueryPlanner. custid
+            is stored as an int, whatever the type it's given as (a session
+            store may return it as text), so lookups match it. """
+        context['custid'] = int(custid)
+        return self.store('results_archive', results,
+                          ('custid', 'subsessionid'), context)
+
+    def store_season_standings(self, query, results):
+        """ query holds the season_standings filters (seasonid, carclassid,
+            clubid, raceweek, division). """
+        return self.store('season_standings', results,
+                          list(query) + ['custid'], query)
+
+    def store_event_results(self, subsessionid, simsessnum, results):
+        return self.store('event_results', results,
+                          ('subsessionid', 'simsessnum', 'custid'),
+                          {'subsessionid': subsessionid,
+                           'simsessnum': simsessnum})
+
+    def store_lap_chart(self, subsessionid, laps):
+        """ laps are the per lap dicts of an event_laps_all response. """
+        return self.store('laps', laps,
+                          ('subsessionid', LAPCHART_CUSTID, LAPCHART_LAP),
+                          {'subsessionid': subsessionid})
+
+    # ArchiveStore
+
+    def get_watermark(self, key):
+        row = self.conn.execute('SELECT value FROM watermarks WHERE key = ?',
+                                (repr(key),)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, key, value):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO watermarks VALUES '
+                              '(?, ?)', (repr(key), value))
+
+    def has(self, custid, subsessionid):
+        if not self._table_columns('results_archive'):
+            return False
+        return self.conn.execute(
+            'SELECT 1 FROM results_archive WHERE custid = ? AND '
+            'subsessionid = ?', (int(custid), int(subsessionid))) \
+            .fetchone() is not None
+
+    def add(self, custid, rows):
+        self.store_results_archive(custid, rows)